@@ -15,6 +15,7 @@ Feature: Key GET methods need authentication
     Given a new stack using the image tag "latest"
     Then the landing page response should be OK
 
+  @concurrent
   Scenario Template: Some REST GET methods should return 'Not Authorized'
 
     Here we do not login to the stack and therefore, for an un-authenticated user,
@@ -31,6 +32,7 @@ Feature: Key GET methods need authentication
       | /api/compound-identifier-types    |
       | /api/token                        |
 
+  @concurrent
   Scenario Template: Some REST GET methods should return 'Not Allowed'
 
     Here we do not login to the stack and therefore, for an un-authenticated user,
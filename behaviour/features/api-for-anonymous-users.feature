@@ -15,6 +15,7 @@ Feature: Empty stack public API operations
     Given a new stack using the image tag "latest"
     Then the landing page response should be OK
 
+  @concurrent
   Scenario Template: Check the main public API methods
 
     These tests, all starting with an empty stack, verify that the selected
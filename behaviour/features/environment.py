@@ -0,0 +1,151 @@
+"""Behaviour (behave) environment hooks.
+
+Hooks that behave runs around the test run (and its features and scenarios).
+See https://behave.readthedocs.io/en/stable/tutorial.html#environmental-controls
+"""
+
+import os
+import re
+import sys
+from typing import Dict, Optional, Tuple
+
+from behave.model import Scenario, ScenarioOutline, Step
+from behave.model_core import Status
+
+# behave loads this file before the step modules,
+# so we need to add the steps directory to the path ourselves.
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "steps"))
+
+# pylint: disable=wrong-import-position
+from api_utils import (
+    api_concurrent_requests,
+    close_api_clients,
+    close_request_log,
+    print_latency_report,
+    set_request_labels,
+)
+from awx_utils import close_awx_clients
+from browser_utils import close_browser
+from config import STACK_DATA_SNAPSHOTS, get_stack_name, get_stack_url
+from requests import RequestException, Response
+from stack_utils import (
+    get_stack_data_snapshot,
+    has_stack_data_snapshot,
+    print_stack_readiness_report,
+    restore_stack_data,
+    save_stack_data,
+)
+
+# The tag used to mark Scenario Outlines whose (read-only) requests
+# can be made concurrently, before the individual examples are run.
+_CONCURRENT_TAG: str = "concurrent"
+# The step whose requests we can make concurrently,
+# and the (safe) methods we're prepared to make.
+_RE_REQUEST_STEP = re.compile(r"^I do a (\w+) request at (\S+)$")
+_CONCURRENT_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# The prefix of the tag that names the stack data (snapshot) a scenario
+# creates (i.e. '@snapshot.a71ev2a-loaded'). If BEHAVIOUR_STACK_DATA_SNAPSHOTS
+# is 'yes' the stack's data is saved after the scenario passes, and restored
+# (rather than running the scenario) if it's been saved before.
+_SNAPSHOT_TAG_PREFIX: str = "snapshot."
+
+# Responses for the '@concurrent' Scenario Outlines we've prepared,
+# keyed by the outline (its location) and then by (method, endpoint).
+_PREFETCHED_RESPONSES: Dict[str, Dict[Tuple[str, str], Response]] = {}
+
+
+def before_scenario(context, scenario: Scenario) -> None:
+    """For Scenarios generated from a '@concurrent' Scenario Outline we make all
+    the outline's requests (for every example) concurrently, before its first
+    scenario runs. Each scenario (example) still runs (and reports) independently,
+    its 'I do a ... request at ...' step using the prefetched response.
+
+    Scenarios tagged '@snapshot.<name>' are skipped if we can restore the
+    stack data they create (see BEHAVIOUR_STACK_DATA_SNAPSHOTS).
+
+    Sets the context members: -
+    - prefetched_responses (for '@concurrent' scenarios)
+    """
+    set_request_labels(scenario=scenario.name)
+
+    snapshot: Optional[str] = _get_stack_data_snapshot(scenario)
+    if snapshot and has_stack_data_snapshot(snapshot):
+        try:
+            restore_stack_data(get_stack_name(), snapshot)
+            scenario.skip(reason=f"Restored stack data ({snapshot})")
+            return
+        except (AssertionError, RequestException) as ex:
+            print(
+                f"Failed to restore stack data ({snapshot}), running the scenario"
+                f" ({ex!r})"
+            )
+
+    outline = scenario.parent
+    if not isinstance(outline, ScenarioOutline):
+        return
+    if _CONCURRENT_TAG not in scenario.effective_tags:
+        return
+
+    outline_key: str = str(outline.location)
+    if outline_key not in _PREFETCHED_RESPONSES:
+        method_endpoints = [
+            (match.group(1), match.group(2))
+            for outline_scenario in outline.scenarios
+            for step in outline_scenario.steps
+            if (match := _RE_REQUEST_STEP.match(step.name))
+            and match.group(1) in _CONCURRENT_METHODS
+        ]
+        print(f"Making {len(method_endpoints)} requests concurrently...")
+        _PREFETCHED_RESPONSES[outline_key] = api_concurrent_requests(
+            base_url=get_stack_url(get_stack_name()),
+            method_endpoints=method_endpoints,
+        )
+    context.prefetched_responses = _PREFETCHED_RESPONSES[outline_key]
+
+
+def after_scenario(context, scenario: Scenario) -> None:
+    """Saves the stack data created by a (passed) scenario tagged
+    '@snapshot.<name>' (see BEHAVIOUR_STACK_DATA_SNAPSHOTS)."""
+    del context  # Unused
+
+    snapshot: Optional[str] = _get_stack_data_snapshot(scenario)
+    if snapshot and scenario.status == Status.passed:
+        try:
+            save_stack_data(get_stack_name(), snapshot)
+        except (AssertionError, RequestException) as ex:
+            print(f"Failed to save stack data ({snapshot}) ({ex!r})")
+
+
+def before_step(context, step: Step) -> None:
+    """Labels the requests made by the step (in the request log)."""
+    set_request_labels(scenario=context.scenario.name, step=step.name)
+
+
+def after_all(context) -> None:
+    """Releases resources shared by all the features,
+    i.e. the browser used for logins and the stack (and AWX) HTTP clients,
+    and prints a summary of the latency of the requests made to the stack
+    (and the time any new stack took to be ready)."""
+    del context  # Unused
+
+    close_browser()
+    close_api_clients()
+    close_awx_clients()
+    close_request_log()
+    print_latency_report()
+    print_stack_readiness_report()
+
+
+def _get_stack_data_snapshot(scenario: Scenario) -> Optional[str]:
+    """Returns the name of the snapshot of the stack data the scenario creates,
+    or None if the scenario is not tagged '@snapshot.<name>'
+    (or stack data snapshots are not enabled)."""
+    if not STACK_DATA_SNAPSHOTS:
+        return None
+    for tag in scenario.effective_tags:
+        if tag.startswith(_SNAPSHOT_TAG_PREFIX):
+            return get_stack_data_snapshot(
+                get_stack_name(), tag[len(_SNAPSHOT_TAG_PREFIX) :]
+            )
+    return None
@@ -0,0 +1,27 @@
+@throughput
+Feature: Measure the throughput of loading several Targets against the public TAS
+
+  This feature loads several target files (located in an S3 bucket) into a new
+  stack at the same time (see BEHAVIOUR_CONCURRENT_UPLOADS) and waits for all of
+  them to be processed, reporting the time each target took to upload
+  and to be processed.
+
+  As it's a measure of the stack (rather than a test of its behaviour)
+  the feature is only run when asked for, i.e. with '--tags=throughput'.
+
+  @produces.stack
+  Scenario: Start with a new stack
+    Given a new stack using the image tag "latest"
+    Then the landing page response should be OK
+
+  @consumes.stack
+  Scenario: Load public targets at the same time
+    Given I can access the "fragalysis-stack-xchem-data" bucket
+    And I can login
+    When I load the following TGZ encoded files against target access string "lb18145-1"
+      | file                                         |
+      | lb32627-66_v2_upload_1_2024-12-09_2025-01-15 |
+      | lb32633-6_v2.2_upload_1_2024-11-22           |
+    Then all the task statuses should have a value of SUCCESS within 20 minutes
+    When I do a GET request at /api/target_experiment_uploads
+    Then the length of the list in the response should be 2
@@ -14,6 +14,7 @@ Feature: Verify good Targets can be loaded against the public TAS
   The steps rely on 'sensitive' material that is expected to be provided
   by environment variables. The tests will alert if these are not set.
 
+  @produces.stack
   Scenario: Start with a new stack
 
     Create a new (up to date) stack.
@@ -22,9 +23,17 @@ Feature: Verify good Targets can be loaded against the public TAS
     The variables it is expected to define will be passed to the
     corresponding AWX Job Template when it's launched.
 
-    Given a new stack using the image tag "latest"
-    Then the landing page response should be OK
+    The stack is created in the background while we get (cache)
+    the target files used by the scenarios that follow.
 
+    Given a new stack is being created using the image tag "latest"
+    And I can access the "fragalysis-stack-xchem-data" bucket
+    When I get the TGZ encoded file lb32627-66_v2_upload_1_2024-12-09_2025-01-15 from the bucket
+    And I get the TGZ encoded file lb32633-6_v2.2_upload_1_2024-11-22 from the bucket
+    Then the new stack is ready
+    And the landing page response should be OK
+
+  @consumes.stack
   Scenario Template: Load public targets
 
     Load target files (located in an S3 bucket) into the stack.
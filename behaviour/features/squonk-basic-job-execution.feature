@@ -9,6 +9,7 @@ Feature: Verify a fragalysis stack can run Squonk Jobs against public Targets
   So the feature starts with a clean stack and scenarios in this feature
   rely on that initial requirement.
 
+  @produces.stack
   Scenario: Create a new stack for Job execution
 
     This initial step can accept a Doc string that represents a Python dictionary.
@@ -32,6 +33,7 @@ Feature: Verify a fragalysis stack can run Squonk Jobs against public Targets
       """
     Then the landing page response should be OK
 
+  @consumes.stack @produces.job-override
   Scenario: Create a JobOverride
     Given I can login as a superuser
     When I do a GET request at /api/job_override
@@ -44,6 +46,7 @@ Feature: Verify a fragalysis stack can run Squonk Jobs against public Targets
     When I do a GET request at /api/job_override
     Then the count must be one larger than the remembered count
 
+  @consumes.job-override
   Scenario Template: Fragmenstein Jobs must exist
     Given I can login
     When I get the JobConfig fragmenstein|<job>|1.0.0
@@ -57,6 +60,7 @@ Feature: Verify a fragalysis stack can run Squonk Jobs against public Targets
       | fragmenstein-place-file            |
       | fragmenstein-place-string          |
 
+  @consumes.stack @produces.target @snapshot.squonk-a71ev2a-loaded
   Scenario: Load A71EV2A Target data against lb18145-1
     Given I do not login
     And I can access the "fragalysis-stack-xchem-data" bucket
@@ -67,6 +71,7 @@ Feature: Verify a fragalysis stack can run Squonk Jobs against public Targets
     And the response should contain a task status endpoint
     And the task status should have a value of SUCCESS within 6 minutes
 
+  @consumes.target @produces.snapshot
   Scenario: Create a SessionProject and Snapshot for A71EV2A
     Given I do not login
     And I can get the "A71EV2A" Target ID
@@ -76,6 +81,7 @@ Feature: Verify a fragalysis stack can run Squonk Jobs against public Targets
     When I create a new Snapshot with the title "Behaviour Snapshot"
     Then the response should be CREATED
 
+  @consumes.snapshot @produces.file-transfer
   Scenario: Transfer A71EV2A Snapshot files to Squonk
 
     This scenario is a reproduction of the test run by Boris
@@ -106,6 +112,7 @@ Feature: Verify a fragalysis stack can run Squonk Jobs against public Targets
     Then the response should be ACCEPTED
     And the file transfer status should have a value of SUCCESS within 30 seconds
 
+  @consumes.job-override @consumes.file-transfer
   Scenario: Run fragmenstein-combine on the A71EV2A Snapshot files
 
     This scenario is a reproduction of the test run by Boris
@@ -145,12 +152,14 @@ Feature: Verify a fragalysis stack can run Squonk Jobs against public Targets
     When I do a GET request at /api/compound-sets
     Then the count must be one larger than the remembered count
 
+  @consumes.file-transfer
   Scenario: Delete the last FileTransfer
     Given I can login
     And I can get the last JobFileTransfer ID
     When I delete the JobFileTransfer
     Then the response should be NO_CONTENT
 
+  @consumes.snapshot
   Scenario: Delete the Snapshot and SessionProject
     Given I do not login
     And I can get the "Behaviour Snapshot" Snapshot ID
@@ -4,14 +4,35 @@ used primarily to reduce the number of lines in the step file.
 """
 
 import json
+import math
 import os
-from datetime import datetime, timezone
-from typing import Any, Dict, Optional
-from urllib.parse import urljoin
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone
+from http.cookiejar import DefaultCookiePolicy
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urljoin, urlparse
 
 import requests
+from config import (
+    CONCURRENT_REQUESTS,
+    CSRF_TOKEN_TTL_S,
+    REQUEST_LOG_BACKUPS,
+    REQUEST_LOG_FILE,
+    REQUEST_LOG_GZIP,
+    REQUEST_LOG_MAX_BYTES,
+    REQUEST_POOL_SIZE,
+    REQUEST_TIMEOUT,
+)
+from log_utils import BufferedLogWriter
 from requests import Response
-from requests_toolbelt import MultipartEncoder
+from requests.adapters import HTTPAdapter
+from requests_toolbelt import MultipartEncoder, MultipartEncoderMonitor
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 
 # Trailing slashes are important!
 _LANDING_PAGE_ENDPOINT: str = "/viewer/react/landing/"
@@ -21,29 +42,241 @@ _JOB_FILE_TRANSFER_ENDPOINT: str = "/api/job_file_transfer/"
 _JOB_REQUEST_ENDPOINT: str = "/api/job_request/"
 _SESSION_PROJECTS_ENDPOINT: str = "/api/session-projects/"
 _SNAPSHOTS_ENDPOINT: str = "/api/snapshots/"
+_TOKEN_ENDPOINT: str = "/api/token"
 _UPLOAD_TARGET_EXPERIMENTS_ENDPOINT: str = "/api/upload_target_experiments/"
 
-# A file request data is written to (for debug)
-_REQUEST_LOGFILE: str = "request.log"
+# The (background) writer of the request log, created when first needed
+_REQUEST_LOG_WRITER: Optional[BufferedLogWriter] = None
+# Held while (any thread is) creating or closing the request log writer
+_REQUEST_LOG_WRITER_LOCK: threading.Lock = threading.Lock()
+
+# Path segments (of a URL) that are object IDs (integers and UUIDs),
+# replaced by '{id}' when collecting latencies for each endpoint.
+_RE_ID_PATH_SEGMENT = re.compile(r"/(\d+|[0-9a-f]{8}-[0-9a-f-]{27})(?=/|$)")
 
 # this needs to be kept more or less up to date
 _USER_AGENT: str = (
     "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 )
 
+# Long-lived (pooled, keep-alive) HTTP clients, one for each stack (base URL).
+# Created on demand by get_api_client().
+_API_CLIENTS: Dict[str, requests.Session] = {}
+_API_CLIENTS_LOCK: threading.Lock = threading.Lock()
+
+# Object IDs found by get_object_id(),
+# keyed by stack (base URL), endpoint, session ID, match field and title.
+_OBJECT_IDS: Dict[Tuple[str, str, Optional[str], str, str], int] = {}
+
+# The scenario and step currently running (set by the environment hooks),
+# added to each request's log record.
+_REQUEST_LABELS: Dict[str, Optional[str]] = {"scenario": None, "step": None}
+
+# The (total) latencies (seconds) of requests, keyed by method and endpoint
+_REQUEST_LATENCIES: Dict[str, List[float]] = {}
+
+# Timings of each upload_target_experiment() call, i.e. the file name, its size
+# (bytes), the time (seconds) taken to send it (upload_s) and the time from
+# sending its last byte to receiving the response headers (ttfb_s).
+_UPLOAD_TIMINGS: List[Dict[str, Any]] = []
+
+# Connection timings (connect_s and tls_s) recorded by the current thread
+# when its request needed a new connection.
+_CONNECTION_TIMINGS = threading.local()
+
+# CSRF tokens, keyed by stack (base URL) and session ID.
+# Each value is the token (None if the stack didn't provide one)
+# and the (monotonic) time it was obtained.
+_CSRF_TOKENS: Dict[Tuple[str, Optional[str]], Tuple[Optional[str], float]] = {}
+
+
+def _logit(resp: Response, *args, **kwargs) -> None:
+    """A response hook (used by all the API clients) that writes a JSON record
+    of the request to the log file (REQUEST_LOG_FILE) for debugging.
+    The record contains the time the request started,
+    the time (seconds) taken to connect (DNS and TCP),
+    negotiate TLS, receive the response headers (ttfb_s) and the whole response
+    (total_s), along with the response status code and size,
+    and the name of the scenario and step that made the request.
+    Connection times are null if an existing (pooled) connection was used."""
+    del args, kwargs  # Unused
+
+    body_start: float = time.perf_counter()
+    size: int = len(resp.content)
+    ttfb: timedelta = resp.elapsed
+    total_s: float = ttfb.total_seconds() + time.perf_counter() - body_start
+
+    request_json: Optional[Any] = None
+    if resp.request.headers.get("Content-Type") == "application/json":
+        request_json = json.loads(resp.request.body)
+
+    record: Dict[str, Any] = {
+        "start": (datetime.now(timezone.utc) - timedelta(seconds=total_s)).isoformat(),
+        "method": resp.request.method,
+        "url": resp.request.url,
+        "json": request_json,
+        "status_code": resp.status_code,
+        "bytes": size,
+        "connect_s": getattr(_CONNECTION_TIMINGS, "connect_s", None),
+        "tls_s": getattr(_CONNECTION_TIMINGS, "tls_s", None),
+        "ttfb_s": ttfb.total_seconds(),
+        "total_s": total_s,
+        "scenario": _REQUEST_LABELS["scenario"],
+        "step": _REQUEST_LABELS["step"],
+    }
+    _CONNECTION_TIMINGS.__dict__.clear()
 
-def _logit(
-    url: str,
-    method: str,
-    *,
-    data: Optional[Dict[str, Any]] = None,
-    params: Optional[Dict[str, Any]] = None,
+    endpoint: str = _RE_ID_PATH_SEGMENT.sub("/{id}", urlparse(resp.request.url).path)
+    _REQUEST_LATENCIES.setdefault(f"{resp.request.method} {endpoint}", []).append(
+        total_s
+    )
+
+    global _REQUEST_LOG_WRITER  # pylint: disable=global-statement
+    with _REQUEST_LOG_WRITER_LOCK:
+        if not _REQUEST_LOG_WRITER:
+            _REQUEST_LOG_WRITER = BufferedLogWriter(
+                REQUEST_LOG_FILE,
+                max_bytes=REQUEST_LOG_MAX_BYTES,
+                backups=REQUEST_LOG_BACKUPS,
+                gzip_on_close=REQUEST_LOG_GZIP,
+            )
+        writer: BufferedLogWriter = _REQUEST_LOG_WRITER
+    writer.write(json.dumps(record))
+
+
+def close_request_log() -> None:
+    """Writes any outstanding request log records and closes the request log."""
+    global _REQUEST_LOG_WRITER  # pylint: disable=global-statement
+    with _REQUEST_LOG_WRITER_LOCK:
+        if _REQUEST_LOG_WRITER:
+            _REQUEST_LOG_WRITER.close()
+            _REQUEST_LOG_WRITER = None
+
+
+def set_request_labels(
+    *, scenario: Optional[str] = None, step: Optional[str] = None
 ) -> None:
-    """Writes the data to a log file for debugging."""
-    now_utc: datetime = datetime.now(timezone.utc)
-    debug: str = f"{now_utc}: {method} {url} json={data} params={params}"
-    with open(_REQUEST_LOGFILE, "a", encoding="utf-8") as logfile:
-        print(debug, file=logfile)
+    """Sets the scenario and step names added to the log record of each request."""
+    _REQUEST_LABELS["scenario"] = scenario
+    _REQUEST_LABELS["step"] = step
+
+
+def print_latency_report() -> None:
+    """Prints a summary of the latency of the requests made to each endpoint,
+    i.e. the number of requests and their 50th, 95th and 99th percentile latency,
+    followed by the throughput of each target upload."""
+    if not _REQUEST_LATENCIES:
+        return
+
+    print("Request latency (seconds) by endpoint: -")
+    print(f"{'count':>6} {'p50':>8} {'p95':>8} {'p99':>8}  endpoint")
+    for endpoint, latencies in sorted(_REQUEST_LATENCIES.items()):
+        ordered: List[float] = sorted(latencies)
+        p50, p95, p99 = (percentile(ordered, percent) for percent in (50, 95, 99))
+        print(f"{len(ordered):>6} {p50:>8.3f} {p95:>8.3f} {p99:>8.3f}  {endpoint}")
+
+    if not _UPLOAD_TIMINGS:
+        return
+
+    print("Upload throughput: -")
+    print(f"{'bytes':>12} {'upload_s':>9} {'MiB/s':>8} {'ttfb_s':>8}  file")
+    for timings in _UPLOAD_TIMINGS:
+        print(
+            f"{timings['bytes']:>12} {timings['upload_s']:>9.3f}"
+            f" {timings['rate_mib_s']:>8.1f} {timings['ttfb_s']:>8.3f}"
+            f"  {timings['file_name']}"
+        )
+
+
+def percentile(ordered: List[float], percent: int) -> float:
+    """Returns the (nearest-rank) percentile of an ordered list of values."""
+    rank: int = max(math.ceil(percent / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def get_api_client(base_url: str) -> requests.Session:
+    """Returns the long-lived HTTP client for the given stack (i.e. https://example.com),
+    creating it if necessary. Clients maintain a pool of keep-alive connections
+    (of size REQUEST_POOL_SIZE) so that we avoid a new TCP/TLS handshake for every call.
+
+    The client is shared by all users of the stack, so it never retains cookies.
+    Session IDs and CSRF tokens are attached to each individual request instead.
+    """
+    with _API_CLIENTS_LOCK:
+        if client := _API_CLIENTS.get(base_url):
+            return client
+
+        client = requests.Session()
+        client.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        client.hooks["response"].append(_logit)
+        adapter = _TimedHTTPAdapter(
+            pool_connections=REQUEST_POOL_SIZE, pool_maxsize=REQUEST_POOL_SIZE
+        )
+        client.mount("https://", adapter)
+        client.mount("http://", adapter)
+        _API_CLIENTS[base_url] = client
+        return client
+
+
+def close_api_clients() -> None:
+    """Closes all the HTTP clients (and their connection pools)."""
+    with _API_CLIENTS_LOCK:
+        for client in _API_CLIENTS.values():
+            client.close()
+        _API_CLIENTS.clear()
+
+
+def is_session_valid(*, base_url: str, session_id: str) -> bool:
+    """Returns True if the session ID is that of a user that is logged into the stack.
+    This is a cheap probe of the stack's token endpoint, which is only
+    available to authenticated users (and which echoes the session ID)."""
+    url: str = urljoin(base_url, _TOKEN_ENDPOINT)
+
+    resp = get_api_client(base_url).get(
+        url,
+        headers={"User-Agent": _USER_AGENT},
+        cookies={"sessionid": session_id},
+        timeout=REQUEST_TIMEOUT,
+    )
+    return resp.status_code == 200 and session_id in resp.text
+
+
+def api_request(*, base_url: str, method: str, endpoint: str) -> Response:
+    """Calls the REST endpoint using the given method, as an anonymous user
+    (i.e. without a session ID or CSRF token). The base url is the root of the API,
+    i.e. https://example.com. POST endpoints are given a trailing slash (Django
+    expects one) if they do not already have one."""
+    if method == "POST" and not endpoint.endswith("/"):
+        endpoint += "/"
+    url: str = urljoin(base_url, endpoint)
+
+    return get_api_client(base_url).request(method, url, timeout=REQUEST_TIMEOUT)
+
+
+def api_concurrent_requests(
+    *, base_url: str, method_endpoints: Iterable[Tuple[str, str]]
+) -> Dict[Tuple[str, str], Response]:
+    """Calls api_request() for each (method, endpoint), making up to
+    CONCURRENT_REQUESTS calls at the same time. The responses are returned in a
+    dictionary keyed by (method, endpoint). Calls that fail (i.e. time out)
+    have no response in the dictionary."""
+    responses: Dict[Tuple[str, str], Response] = {}
+    with ThreadPoolExecutor(max_workers=CONCURRENT_REQUESTS) as executor:
+        futures = {
+            method_endpoint: executor.submit(
+                api_request,
+                base_url=base_url,
+                method=method_endpoint[0],
+                endpoint=method_endpoint[1],
+            )
+            for method_endpoint in set(method_endpoints)
+        }
+        for method_endpoint, future in futures.items():
+            try:
+                responses[method_endpoint] = future.result()
+            except requests.RequestException as ex:
+                print(f"Concurrent {method_endpoint} request failed ({ex})")
+    return responses
 
 
 def api_get_request(
@@ -58,11 +291,107 @@ def api_get_request(
     API method to call, i.e. /api/job_config and the session ID is the session ID to
     use for the call."""
     url: str = urljoin(base_url, endpoint)
-    _logit(url, "GET", params=params)
 
-    with requests.Session() as session:
-        _prepare_session(session, base_url=base_url, session_id=session_id)
-        return session.get(url, params=params)
+    return _send("GET", url, base_url=base_url, session_id=session_id, params=params)
+
+
+def api_get_paginated_results(
+    *,
+    base_url: str,
+    endpoint: str,
+    session_id: Optional[str],
+    params: Optional[Dict[str, Any]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Lazily yields the objects from a (DRF) list endpoint, using an optional
+    session ID. Each page of 'results' is only requested when it's needed,
+    by following the response's 'next' link. Responses that are not paginated
+    (a plain list) are also handled. The GET must be successful (200)."""
+    next_endpoint: Optional[str] = endpoint
+    while next_endpoint:
+        resp = api_get_request(
+            base_url=base_url,
+            endpoint=next_endpoint,
+            session_id=session_id,
+            params=params,
+        )
+        assert resp.status_code == 200, f"Expected 200, was {resp.status_code}"
+        data = resp.json()
+        if isinstance(data, list):
+            yield from data
+            return
+        assert "results" in data
+        yield from data["results"]
+        # The 'next' link is a complete URL (including the parameters)
+        next_endpoint = data.get("next")
+        params = None
+
+
+def get_object_id(
+    *,
+    base_url: str,
+    endpoint: str,
+    session_id: Optional[str],
+    title: str,
+    match_field: str = "title",
+) -> Optional[int]:
+    """Returns the ID of the object with the given title, found using the (DRF) list
+    endpoint (i.e. /api/targets/), and an optional session ID. The title is matched
+    against the object's match_field, which is 'title' for most objects but (for
+    example) is 'target_access_string' for Projects. The list is filtered
+    by the field, and its pages are searched until the first object with the title
+    is found. IDs that are found are remembered (for the stack, endpoint and session)
+    and None is returned if there's no object with the title."""
+    key: Tuple[str, str, Optional[str], str, str] = (
+        base_url,
+        endpoint,
+        session_id,
+        match_field,
+        title,
+    )
+    if key in _OBJECT_IDS:
+        return _OBJECT_IDS[key]
+
+    obj: Optional[Dict[str, Any]] = next(
+        (
+            obj
+            for obj in api_get_paginated_results(
+                base_url=base_url,
+                endpoint=endpoint,
+                session_id=session_id,
+                params={match_field: title},
+            )
+            if obj.get(match_field) == title
+        ),
+        None,
+    )
+    if not obj:
+        return None
+    _OBJECT_IDS[key] = obj["id"]
+    return obj["id"]
+
+
+def get_last_object(
+    *, base_url: str, endpoint: str, session_id: Optional[str]
+) -> Optional[Dict[str, Any]]:
+    """Returns the last (most recently created, i.e. highest ID) object from the
+    (DRF) list endpoint, using an optional session ID. None is returned if the list
+    is empty. All the list's pages are read, and the result is not remembered."""
+    return max(
+        api_get_paginated_results(
+            base_url=base_url, endpoint=endpoint, session_id=session_id
+        ),
+        key=lambda obj: obj["id"],
+        default=None,
+    )
+
+
+def forget_object_ids(*, base_url: str, endpoint: Optional[str] = None) -> None:
+    """Forgets the object IDs remembered by get_object_id() for the stack,
+    or just those for an endpoint on the stack. Used when objects are deleted
+    (or the stack is replaced)."""
+    for key in list(_OBJECT_IDS):
+        if key[0] == base_url and endpoint in (None, key[1]):
+            del _OBJECT_IDS[key]
 
 
 def api_delete_request(
@@ -73,11 +402,8 @@ def api_delete_request(
     API method to call, i.e. /api/job_config and the session ID is the session ID to
     use for the call."""
     url: str = urljoin(base_url, endpoint)
-    _logit(url, "DELETE")
 
-    with requests.Session() as session:
-        _prepare_session(session, base_url=base_url, session_id=session_id)
-        return session.delete(url)
+    return _send("DELETE", url, base_url=base_url, session_id=session_id)
 
 
 def api_post_request(
@@ -92,11 +418,8 @@ def api_post_request(
     API method to call, i.e. /api/job_config and the session ID is the session ID to
     use for the call."""
     url: str = urljoin(base_url, endpoint)
-    _logit(url, "POST", data=data)
 
-    with requests.Session() as session:
-        _prepare_session(session, base_url=base_url, session_id=session_id)
-        return session.post(url, json=data)
+    return _send("POST", url, base_url=base_url, session_id=session_id, json=data)
 
 
 def create_session_project(
@@ -111,11 +434,8 @@ def create_session_project(
     print(f"Creating SessionProject with data: {data}...")
 
     url: str = urljoin(base_url, _SESSION_PROJECTS_ENDPOINT)
-    _logit(url, "POST", data=data)
 
-    with requests.Session() as session:
-        _prepare_session(session, base_url=base_url, session_id=session_id)
-        return session.post(url, json=data)
+    return _send("POST", url, base_url=base_url, session_id=session_id, json=data)
 
 
 def create_snapshot(
@@ -133,11 +453,8 @@ def create_snapshot(
     print(f"Creating Snapshot with data: {data}...")
 
     url: str = urljoin(base_url, _SNAPSHOTS_ENDPOINT)
-    _logit(url, "POST", data=data)
 
-    with requests.Session() as session:
-        _prepare_session(session, base_url=base_url, session_id=session_id)
-        return session.post(url, json=data)
+    return _send("POST", url, base_url=base_url, session_id=session_id, json=data)
 
 
 def upload_target_experiment(
@@ -145,34 +462,67 @@ def upload_target_experiment(
     base_url: str,
     session_id: str,
     tas: str,
-    file_directory: str,
     file_name: str,
+    file_directory: Optional[str] = None,
+    file_stream: Any = None,
+    progress_callback: Optional[Callable[[int, int], None]] = None,
 ) -> Response:
-    """Uploads target data to the stack using the given TAS and file path."""
-
-    url: str = urljoin(base_url, _UPLOAD_TARGET_EXPERIMENTS_ENDPOINT)
-    _logit(url, "POST")
+    """Uploads target data to the stack using the given TAS and file path.
+    Instead of a file directory the caller can provide a stream of the file's
+    content (an object with a 'read()' method and a 'len' attribute, like the one
+    returned by s3_utils.open_object_stream()) that's read as it's uploaded.
 
-    with requests.Session() as session:
+    The progress callback is called with the number of bytes sent and the
+    total number of bytes as the upload progresses (by default we print the
+    progress every 10%). The upload rate, and the time the stack took to respond
+    once the upload was complete, are printed and added to the latency report."""
+    assert (file_directory is None) != (file_stream is None)
 
-        _prepare_session(session, base_url=base_url, session_id=session_id)
+    url: str = urljoin(base_url, _UPLOAD_TARGET_EXPERIMENTS_ENDPOINT)
 
+    with ExitStack() as stack:
+        if file_stream is None:
+            assert file_directory is not None
+            file_stream = stack.enter_context(
+                open(os.path.join(file_directory, file_name), "rb")
+            )
         encoder = MultipartEncoder(
             fields={
                 "target_access_string": tas,
-                "file": (
-                    file_name,
-                    open(  # pylint: disable=consider-using-with
-                        os.path.join(file_directory, file_name), "rb"
-                    ),
-                    "application/octet-stream",
-                ),
+                "file": (file_name, file_stream, "application/octet-stream"),
             }
         )
 
-        content_type = encoder.content_type
-        session.headers.update({"Content-Type": content_type})
-        return session.post(url, data=encoder, stream=True)
+        timer = _UploadTimer(progress_callback or _UploadProgressPrinter())
+        monitor = MultipartEncoderMonitor(encoder, timer)
+        resp: Response = _send(
+            "POST",
+            url,
+            base_url=base_url,
+            session_id=session_id,
+            data=monitor,
+            headers={"Content-Type": monitor.content_type},
+            stream=True,
+        )
+        timer.response_time = time.perf_counter()
+
+    if timer.last_read_time is not None:
+        assert timer.first_read_time is not None
+        upload_s: float = max(timer.last_read_time - timer.first_read_time, 1e-6)
+        timings: Dict[str, Any] = {
+            "file_name": file_name,
+            "bytes": monitor.bytes_read,
+            "upload_s": upload_s,
+            "rate_mib_s": monitor.bytes_read / upload_s / 1048576,
+            "ttfb_s": timer.response_time - timer.last_read_time,
+        }
+        _UPLOAD_TIMINGS.append(timings)
+        print(
+            f"Uploaded {timings['bytes']} bytes in {upload_s:.1f}s"
+            f" ({timings['rate_mib_s']:.1f} MiB/s),"
+            f" the response took a further {timings['ttfb_s']:.1f}s"
+        )
+    return resp
 
 
 def initiate_job_file_transfer(
@@ -198,11 +548,8 @@ def initiate_job_file_transfer(
     print(f"Initiating Squonk file transfer with data: {data}...")
 
     url: str = urljoin(base_url, _JOB_FILE_TRANSFER_ENDPOINT)
-    _logit(url, "POST", data=data)
 
-    with requests.Session() as session:
-        _prepare_session(session, base_url=base_url, session_id=session_id)
-        return session.post(url, json=data)
+    return _send("POST", url, base_url=base_url, session_id=session_id, json=data)
 
 
 def initiate_job_request(
@@ -235,11 +582,8 @@ def initiate_job_request(
     print(f"Initiating Squonk file transfer with data: {data}...")
 
     url: str = urljoin(base_url, _JOB_REQUEST_ENDPOINT)
-    _logit(url, "POST", data=data)
 
-    with requests.Session() as session:
-        _prepare_session(session, base_url=base_url, session_id=session_id)
-        return session.post(url, json=data)
+    return _send("POST", url, base_url=base_url, session_id=session_id, json=data)
 
 
 def get_job_config(
@@ -260,27 +604,177 @@ def get_job_config(
     print(f"Getting JobConfig with params: {params}...")
 
     url: str = urljoin(base_url, _JOB_CONFIG_ENDPOINT)
-    _logit(url, "GET", params=params)
 
-    with requests.Session() as session:
-        _prepare_session(session, base_url=base_url, session_id=session_id)
-        return session.get(url, params=params)
+    return _send("GET", url, base_url=base_url, session_id=session_id, params=params)
 
 
 # Local functions
 
 
-def _prepare_session(session, *, base_url: str, session_id: str) -> None:
-    """Prepares a session for use with the stack."""
-    session.headers.update(
-        {
-            "User-Agent": _USER_AGENT,
-            "Referer": urljoin(base_url, _LANDING_PAGE_ENDPOINT),
-            "Referrer-policy": "same-origin",
+class _TimedConnectionMixin:  # pylint: disable=too-few-public-methods
+    """Records the time taken to connect (DNS and TCP) a new connection
+    (and for HTTPS the time taken to negotiate TLS)
+    in the thread's _CONNECTION_TIMINGS."""
+
+    def _new_conn(self):
+        start: float = time.perf_counter()
+        sock = super()._new_conn()  # type: ignore[misc]
+        _CONNECTION_TIMINGS.connect_s = time.perf_counter() - start
+        return sock
+
+    def connect(self) -> None:
+        """Connects, recording the time taken by anything other than
+        the DNS and TCP connection (i.e. the TLS handshake)."""
+        start: float = time.perf_counter()
+        super().connect()  # type: ignore[misc]
+        if isinstance(self, HTTPSConnection):
+            _CONNECTION_TIMINGS.tls_s = (
+                time.perf_counter() - start - _CONNECTION_TIMINGS.connect_s
+            )
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    """An HTTP connection that records its connection time."""
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    """An HTTPS connection that records its connection and TLS time."""
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    """An HTTP connection pool using timed connections."""
+
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    """An HTTPS connection pool using timed connections."""
+
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    """An HTTPAdapter whose (pooled) connections record their connection times."""
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
         }
+
+
+class _UploadProgressPrinter:  # pylint: disable=too-few-public-methods
+    """The default upload progress callback, printing the progress every 10%."""
+
+    def __init__(self) -> None:
+        self._reported_percent: int = 0
+
+    def __call__(self, bytes_sent: int, total_bytes: int) -> None:
+        percent: int = bytes_sent * 100 // max(total_bytes, 1)
+        if percent >= self._reported_percent + 10:
+            self._reported_percent = percent - percent % 10
+            print(f"Uploaded {self._reported_percent}%...")
+
+
+class _UploadTimer:  # pylint: disable=too-few-public-methods
+    """A MultipartEncoderMonitor callback that records the (perf_counter) time
+    the first and last bytes of an upload were read (sent), passing the progress
+    (bytes sent and total bytes) to the given callback. The caller records
+    the time the response was received."""
+
+    def __init__(self, progress_callback: Callable[[int, int], None]) -> None:
+        self._progress_callback: Callable[[int, int], None] = progress_callback
+        self.first_read_time: Optional[float] = None
+        self.last_read_time: Optional[float] = None
+        self.response_time: float = 0.0
+
+    def __call__(self, monitor: MultipartEncoderMonitor) -> None:
+        self.last_read_time = time.perf_counter()
+        if self.first_read_time is None:
+            self.first_read_time = self.last_read_time
+        self._progress_callback(monitor.bytes_read, monitor.len)
+
+
+def _send(
+    method: str, url: str, *, base_url: str, session_id: Optional[str], **kwargs
+) -> Response:
+    """Sends a request to the stack using the stack's (pooled) client,
+    adding the headers and cookies needed for the stack and the session ID.
+    Any extra 'headers' are added to those we prepare.
+
+    If the stack rejects our (cached) CSRF token we get a new one and,
+    as long as the request body can be sent again, we retry the request."""
+    client = get_api_client(base_url)
+    extra_headers: Dict[str, str] = kwargs.pop("headers", {})
+
+    headers, cookies = _prepare_session(
+        client, base_url=base_url, session_id=session_id
     )
-    session.get(base_url)  # A GET sets any csrftoken
-    if csrftoken := session.cookies.get("csrftoken", None):
-        session.headers.update({"X-CSRFToken": csrftoken, "User-Agent": _USER_AGENT})
+    resp = client.request(
+        method, url, headers=headers | extra_headers, cookies=cookies, **kwargs
+    )
+    if _is_csrf_failure(resp):
+        print("CSRF failure, refreshing the CSRF token...")
+        _CSRF_TOKENS.pop((base_url, session_id), None)
+        # A (streamed) MultipartEncoder has been consumed and cannot be re-sent.
+        if not isinstance(
+            kwargs.get("data"), (MultipartEncoder, MultipartEncoderMonitor)
+        ):
+            headers, cookies = _prepare_session(
+                client, base_url=base_url, session_id=session_id
+            )
+            resp = client.request(
+                method, url, headers=headers | extra_headers, cookies=cookies, **kwargs
+            )
+    return resp
+
+
+def _prepare_session(
+    client: requests.Session, *, base_url: str, session_id: Optional[str]
+) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """Prepares the headers and cookies for a request to the stack,
+    returned as a tuple (headers, cookies) that are passed to the client."""
+    headers: Dict[str, str] = {
+        "User-Agent": _USER_AGENT,
+        "Referer": urljoin(base_url, _LANDING_PAGE_ENDPOINT),
+        "Referrer-policy": "same-origin",
+    }
+    cookies: Dict[str, str] = {}
+    if csrftoken := _get_csrf_token(client, base_url=base_url, session_id=session_id):
+        headers["X-CSRFToken"] = csrftoken
+        cookies["csrftoken"] = csrftoken
     if session_id:
-        session.cookies.update({"sessionid": session_id})
+        cookies["sessionid"] = session_id
+    return headers, cookies
+
+
+def _get_csrf_token(
+    client: requests.Session, *, base_url: str, session_id: Optional[str]
+) -> Optional[str]:
+    """Returns the CSRF token for the stack and session ID, using a cached value
+    unless it's older than CSRF_TOKEN_TTL_S. New tokens are obtained from the
+    cookies set by a GET of the stack's landing page."""
+    key: Tuple[str, Optional[str]] = (base_url, session_id)
+    if cached := _CSRF_TOKENS.get(key):
+        csrftoken, obtained = cached
+        if time.monotonic() - obtained < CSRF_TOKEN_TTL_S:
+            return csrftoken
+
+    csrftoken = None
+    resp = client.get(
+        base_url,
+        headers={"User-Agent": _USER_AGENT},
+        cookies={"sessionid": session_id} if session_id else None,
+    )
+    # The client does not keep cookies,
+    # so look for the token in the response (and any redirects).
+    for hop in [*resp.history, resp]:
+        csrftoken = hop.cookies.get("csrftoken", csrftoken)
+    _CSRF_TOKENS[key] = (csrftoken, time.monotonic())
+    return csrftoken
+
+
+def _is_csrf_failure(resp: Response) -> bool:
+    """True if the response is the stack's rejection of a CSRF token."""
+    return resp.status_code == 403 and "CSRF" in resp.text
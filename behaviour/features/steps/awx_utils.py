@@ -1,63 +1,166 @@
 """
 AWX utilities for steps.
 Logic that allows us to run AWX Job Templates (to wipe and create stacks).
+Templates are launched (and their Jobs followed) using AWX's REST API.
 """
 
-import os
-import shlex
-import subprocess
-import tempfile
-
-import yaml
-from config import AWX_HOST, AWX_PASSWORD, AWX_USERNAME, get_env_name
-
-
-def launch_awx_job_template(template, *, extra_vars) -> None:
-    """A utility to launch the named AWX JobTemplate
-    while also providing extra variables via a temporary file.
+import threading
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urljoin
+
+import requests
+from config import (
+    AWX_HOST,
+    AWX_JOB_TIMEOUT_S,
+    AWX_PASSWORD,
+    AWX_USERNAME,
+    REQUEST_TIMEOUT,
+    get_env_name,
+)
+from poll_utils import poll
+
+_JOB_TEMPLATES_ENDPOINT: str = "/api/v2/job_templates/"
+_JOBS_ENDPOINT: str = "/api/v2/jobs/"
+
+# The status of AWX Jobs that have finished
+_JOB_FINISHED_STATUSES = {"successful", "failed", "error", "canceled"}
+
+# Long-lived (pooled, keep-alive) HTTP clients, one for each AWX server (URL).
+# Created on demand by _get_awx_client().
+_AWX_CLIENTS: Dict[str, requests.Session] = {}
+_AWX_CLIENTS_LOCK: threading.Lock = threading.Lock()
+
+# Job Template IDs, keyed by AWX server (URL) and Job Template name
+_JOB_TEMPLATE_IDS: Dict[Tuple[str, str], int] = {}
+
+
+def launch_awx_job_template(
+    template, *, extra_vars, awx_url: Optional[str] = None
+) -> None:
+    """A utility to launch the named AWX JobTemplate, providing extra variables,
+    and wait for its Job to finish (printing the Job's output as it runs).
+    The AWX server is 'https://{BEHAVIOUR_AWX_HOST}' unless an AWX URL
+    (i.e. http://localhost:8080) is provided.
     """
 
-    if not AWX_HOST:
+    if not AWX_HOST and not awx_url:
         raise ValueError(get_env_name("AWX_HOST") + " is not set")
     if not AWX_USERNAME:
         raise ValueError(get_env_name("AWX_USERNAME") + " is not set")
     if not AWX_PASSWORD:
         raise ValueError(get_env_name("AWX_PASSWORD") + " is not set")
 
+    awx_url = awx_url or f"https://{AWX_HOST}"
+    client: requests.Session = _get_awx_client(awx_url)
+
     print(f"Launching AWX JobTemplate '{template}'...")
     print(f"AWX JobTemplate extra_vars={extra_vars}")
 
-    cmd = "awx job_templates launch --wait"
-
-    # Put any extra_vars into a local temporary YAML file
-    fp = None
-    if extra_vars:
-        with tempfile.NamedTemporaryFile(mode="w", delete=False) as fp:
-            yaml.dump(extra_vars, fp)
-
-        cmd += f" --extra_vars @{fp.name}"
-
-    cmd += f' "{template}"'
-
-    # Split the command into a sequence for subprocess.run()
-    # and inject the required environment variables.
-
-    split_cmd = shlex.split(cmd)
-
-    env = os.environ.copy()
-    env["CONTROLLER_HOST"] = f"https://{AWX_HOST}"
-    env["CONTROLLER_USERNAME"] = AWX_USERNAME
-    env["CONTROLLER_PASSWORD"] = AWX_PASSWORD
-
-    cmd_process = subprocess.run(split_cmd, capture_output=True, check=False, env=env)
-    if cmd_process.returncode != 0:
+    template_id: int = _get_job_template_id(client, awx_url=awx_url, name=template)
+    resp = client.post(
+        urljoin(awx_url, f"{_JOB_TEMPLATES_ENDPOINT}{template_id}/launch/"),
+        json={"extra_vars": extra_vars or {}},
+        timeout=REQUEST_TIMEOUT,
+    )
+    if not resp.ok:
         print(f"Error launching AWX JobTemplate '{template}'")
-        print(f"process.returncode: {cmd_process.returncode}")
-        print(f"STDOUT:\n{cmd_process.stdout}")
-        print(f"STDERR:\n{cmd_process.stderr}")
+        print(f"status_code: {resp.status_code}")
+        print(f"text:\n{resp.text}")
+        assert False
+    job_id: int = resp.json()["job"]
+    print(f"Launched AWX JobTemplate '{template}' (Job {job_id}), waiting...")
+
+    job: Dict[str, Any] = _wait_for_job(client, awx_url=awx_url, job_id=job_id)
+    if job["status"] != "successful":
+        print(f"Error running AWX JobTemplate '{template}' (Job {job_id})")
+        print(f"status: {job['status']}")
+        print(f"job_explanation: {job.get('job_explanation')}")
         assert False
 
     print(f"Successfully launched AWX JobTemplate '{template}'...")
 
-    if fp:
-        os.remove(fp.name)
+
+def close_awx_clients() -> None:
+    """Closes all the AWX HTTP clients (and their connection pools)."""
+    with _AWX_CLIENTS_LOCK:
+        for client in _AWX_CLIENTS.values():
+            client.close()
+        _AWX_CLIENTS.clear()
+
+
+# Local functions
+
+
+def _get_awx_client(awx_url: str) -> requests.Session:
+    """Returns the long-lived HTTP client for the given AWX server,
+    creating it if necessary. Requests are authenticated with the AWX user."""
+    with _AWX_CLIENTS_LOCK:
+        if client := _AWX_CLIENTS.get(awx_url):
+            return client
+
+        assert AWX_USERNAME
+        assert AWX_PASSWORD
+        client = requests.Session()
+        client.auth = (AWX_USERNAME, AWX_PASSWORD)
+        _AWX_CLIENTS[awx_url] = client
+        return client
+
+
+def _get_job_template_id(client: requests.Session, *, awx_url: str, name: str) -> int:
+    """Returns the ID of the named Job Template (remembering it)."""
+    if (awx_url, name) not in _JOB_TEMPLATE_IDS:
+        resp = client.get(
+            urljoin(awx_url, _JOB_TEMPLATES_ENDPOINT),
+            params={"name": name},
+            timeout=REQUEST_TIMEOUT,
+        )
+        resp.raise_for_status()
+        results = resp.json()["results"]
+        if not results:
+            print(f"AWX JobTemplate '{name}' does not exist")
+            assert False
+        _JOB_TEMPLATE_IDS[(awx_url, name)] = results[0]["id"]
+    return _JOB_TEMPLATE_IDS[(awx_url, name)]
+
+
+def _wait_for_job(
+    client: requests.Session, *, awx_url: str, job_id: int
+) -> Dict[str, Any]:
+    """Waits for the Job to finish, printing the output of its events
+    as they arrive, and returns the (finished) Job."""
+    job_url: str = urljoin(awx_url, f"{_JOBS_ENDPOINT}{job_id}/")
+    # The counter of the last event we printed
+    last_counter: int = 0
+
+    def print_new_events() -> None:
+        nonlocal last_counter
+        next_url: Optional[str] = urljoin(job_url, "job_events/")
+        params: Optional[Dict[str, Any]] = {
+            "counter__gt": last_counter,
+            "order_by": "counter",
+        }
+        while next_url:
+            resp = client.get(next_url, params=params, timeout=REQUEST_TIMEOUT)
+            resp.raise_for_status()
+            for event in resp.json()["results"]:
+                if event.get("stdout"):
+                    print(event["stdout"])
+                last_counter = max(last_counter, event["counter"])
+            # The next page's URL includes the query
+            next_url = resp.json().get("next")
+            next_url = urljoin(awx_url, next_url) if next_url else None
+            params = None
+
+    def job_probe() -> Tuple[bool, Dict[str, Any]]:
+        resp = client.get(job_url, timeout=REQUEST_TIMEOUT)
+        resp.raise_for_status()
+        job: Dict[str, Any] = resp.json()
+        print_new_events()
+        return job["status"] in _JOB_FINISHED_STATUSES, job
+
+    result = poll(job_probe, timeout=timedelta(seconds=AWX_JOB_TIMEOUT_S))
+    if not result.done:
+        print(f"Timed out waiting for AWX Job {job_id} ({result.value['status']})")
+        assert False
+    return result.value
@@ -1,19 +1,35 @@
 #!/usr/bin/env python
 """Utilities for interacting with the fragalysis UI that are normally accomplished
-via a browser, such as logging in. Underlying logic is handled by playwright.
+via a browser, such as logging in. Underlying logic is handled by playwright,
+although some logins can be handled by plain HTTP form submission.
 """
+import json
 import os
 import re
 from html import unescape
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+from urllib.parse import urljoin
 
+import requests
+from api_utils import is_session_valid
 from config import (
     DJANGO_SUPERUSER_PASSWORD,
     ENV_PREFIX,
+    HTTP_LOGIN_TYPES,
+    LOGIN_CACHE_FILE,
+    REQUEST_TIMEOUT,
     STACK_PASSWORD,
     STACK_USERNAME,
     get_env_name,
 )
-from playwright.sync_api import expect, sync_playwright
+from playwright.sync_api import (
+    Browser,
+    BrowserContext,
+    Playwright,
+    expect,
+    sync_playwright,
+)
 
 # The playwright launch channel (i.e. Google Chrome?)
 _PW_LAUNCH_CHANNEL: str = "chrome"
@@ -21,6 +37,23 @@ _PW_LAUNCH_CHANNEL: str = "chrome"
 # How to find the session ID from the /api/token page...
 _RE_SESSION_ID = re.compile(r"\"sessionid\": \"([a-z0-9]+)\"")
 
+# The login page (relative to the host URL) for each login type
+# that can be handled using plain HTTP (i.e. without a browser).
+_HTTP_LOGIN_PATHS: Dict[str, str] = {
+    "keycloak": "/accounts/login",
+    "superuser": "/admin/login/",
+}
+
+# The playwright instance and (Chromium) browser shared by all browser logins.
+# The browser is launched when it's first needed (see _get_browser())
+# and is closed at the end of the test run (see close_browser()).
+_PLAYWRIGHT: Optional[Playwright] = None
+_BROWSER: Optional[Browser] = None
+
+# Session IDs of prior logins, keyed by "<host URL>|<login type>|<username>".
+# Loaded from (and saved to) any LOGIN_CACHE_FILE.
+_SESSION_IDS: Optional[Dict[str, str]] = None
+
 
 def login(
     host_url: str, *, login_type: str = "cas", login_username: str = "DEFAULT"
@@ -41,6 +74,14 @@ def login(
     authentication mechanism (the admin panel). It has a built-in username of 'admin'
     and a password that can be found in 'BEHAVIOUR_DJANGO_SUPERUSER_PASSWORD'.
     The login_username is ignored if the login_type is 'superuser'.
+
+    'superuser' and 'keycloak' logins are made using plain HTTP (without a browser)
+    if the login type is named in 'BEHAVIOUR_HTTP_LOGIN_TYPES',
+    falling back to the browser if that fails.
+
+    The session IDs of successful logins are cached (and saved to any
+    'BEHAVIOUR_LOGIN_CACHE_FILE') and re-used, without using a browser,
+    for as long as the stack reports them as valid.
     """
     if not STACK_USERNAME:
         raise ValueError(get_env_name("STACK_USERNAME") + " is not set")
@@ -75,51 +116,197 @@ def login(
     assert username
     assert password
 
-    session_id_value: str = ""
-    with sync_playwright() as spw:
+    cache_key: str = f"{host_url}|{login_type}|{username}"
+    if cached_session_id := _get_valid_session_id(host_url, cache_key=cache_key):
+        print(f"Using existing login (Session ID {cached_session_id})")
+        return cached_session_id
+
+    session_id_value: str = _run_login_logic(
+        host_url, login_type=login_type, user=username, password=password
+    )
+
+    _get_session_ids()[cache_key] = session_id_value
+    _save_session_ids()
+
+    return session_id_value
+
+
+def close_browser() -> None:
+    """Closes the shared browser (if it was launched).
+    Called at the end of the test run (from the after_all hook)."""
+    global _PLAYWRIGHT, _BROWSER  # pylint: disable=global-statement
+    if _BROWSER:
+        _BROWSER.close()
+        _BROWSER = None
+    if _PLAYWRIGHT:
+        _PLAYWRIGHT.stop()
+        _PLAYWRIGHT = None
+
+
+# Local functions --------------------------------------------------------------
+
+
+def _run_login_logic(
+    host_url: str, *, login_type: str, user: str, password: str
+) -> str:
+    """Runs the login logic for the login type, returning the session ID.
+    We use HTTP for the login if we can, otherwise we use playwright."""
+    if login_type in HTTP_LOGIN_TYPES and login_type in _HTTP_LOGIN_PATHS:
+        if session_id_value := _run_http_login_logic(
+            host_url,
+            login_path=_HTTP_LOGIN_PATHS[login_type],
+            user=user,
+            password=password,
+        ):
+            return session_id_value
+        print("HTTP login failed, falling back to the browser...")
+
+    # Each browser login uses its own (isolated) context in the shared browser.
+    browser_context = _get_browser().new_context()
+    try:
         if login_type == "cas":
             session_id_value = _run_login_logic_for_cas(
-                spw,
+                browser_context,
                 host_url=host_url,
-                user=username,
+                user=user,
                 password=password,
             )
         elif login_type == "keycloak":
             session_id_value = _run_login_logic_for_keycloak(
-                spw,
+                browser_context,
                 host_url=host_url,
-                user=username,
+                user=user,
                 password=password,
             )
         elif login_type == "keycloak-fragalysis":
             session_id_value = _run_login_logic_for_keycloak_fragalysis(
-                spw,
+                browser_context,
                 host_url=host_url,
-                user=username,
+                user=user,
                 password=password,
             )
         elif login_type == "superuser":
             session_id_value = _run_login_logic_for_superuser(
-                spw,
+                browser_context,
                 host_url=host_url,
-                user=username,
+                user=user,
                 password=password,
             )
         else:
             raise ValueError(f"Unknown login type: {login_type}")
+    finally:
+        browser_context.close()
 
     return session_id_value
 
 
-# Local functions --------------------------------------------------------------
-
-
-def _run_login_logic_for_cas(spw: sync_playwright, *, host_url, user, password) -> str:
+def _get_browser() -> Browser:
+    """Returns the shared browser, launching it if necessary."""
+    global _PLAYWRIGHT, _BROWSER  # pylint: disable=global-statement
+    if not _BROWSER:
+        print("Launching browser...")
+        _PLAYWRIGHT = sync_playwright().start()
+        _BROWSER = _PLAYWRIGHT.chromium.launch(channel=_PW_LAUNCH_CHANNEL)
+    return _BROWSER
+
+
+class _FormParser(HTMLParser):
+    """Collects the forms (their action and input values) found in an HTML page."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.forms: List[Dict[str, Dict[str, str]]] = []
+
+    def handle_starttag(self, tag, attrs) -> None:
+        attributes: Dict[str, str] = {name: value or "" for name, value in attrs}
+        if tag == "form":
+            self.forms.append({"attributes": attributes, "inputs": {}})
+        elif tag == "input" and self.forms and "name" in attributes:
+            self.forms[-1]["inputs"][attributes["name"]] = attributes.get("value", "")
+
+
+def _run_http_login_logic(
+    host_url: str, *, login_path: str, user: str, password: str
+) -> Optional[str]:
+    """Logs in by submitting the user and password to the login form found
+    by following the login path, returning the session ID (or None on failure).
+    The form is expected to have 'username' and 'password' inputs, as is the case
+    for Keycloak and for the Django admin panel."""
+    login_url = f"{host_url}{login_path}"
+    print(f"Logging in using HTTP to '{login_url}' (as '{user}')...")
+
+    with requests.Session() as session:
+        resp = session.get(login_url, timeout=REQUEST_TIMEOUT)
+        if resp.status_code != 200:
+            return None
+
+        parser = _FormParser()
+        parser.feed(resp.text)
+        form = next(
+            (form for form in parser.forms if "password" in form["inputs"]), None
+        )
+        if not form:
+            return None
+
+        # The form's inputs (including hidden things like CSRF tokens)
+        # with the user's credentials.
+        data: Dict[str, str] = form["inputs"] | {"username": user, "password": password}
+        action_url = urljoin(resp.url, form["attributes"].get("action") or resp.url)
+        resp = session.post(
+            action_url,
+            data=data,
+            headers={"Referer": resp.url},
+            timeout=REQUEST_TIMEOUT,
+        )
+        if resp.status_code != 200:
+            return None
+
+        print("Getting Session ID...")
+        resp = session.get(f"{host_url}/api/token", timeout=REQUEST_TIMEOUT)
+        if match := _RE_SESSION_ID.search(unescape(resp.text)):
+            session_id_value: str = match.group(1)
+            print(f"Got Session ID ({session_id_value})")
+            return session_id_value
+
+    return None
+
+
+def _get_session_ids() -> Dict[str, str]:
+    """Returns the cache of login session IDs,
+    loading it from any LOGIN_CACHE_FILE when first called."""
+    global _SESSION_IDS  # pylint: disable=global-statement
+    if _SESSION_IDS is None:
+        _SESSION_IDS = {}
+        if LOGIN_CACHE_FILE and os.path.isfile(LOGIN_CACHE_FILE):
+            with open(LOGIN_CACHE_FILE, "r", encoding="utf-8") as cache_file:
+                _SESSION_IDS = json.load(cache_file)
+    return _SESSION_IDS
+
+
+def _get_valid_session_id(host_url: str, *, cache_key: str) -> Optional[str]:
+    """Returns the cached session ID for the login (cache key),
+    but only if the stack tells us that it's still valid."""
+    if cached_session_id := _get_session_ids().get(cache_key):
+        if is_session_valid(base_url=host_url, session_id=cached_session_id):
+            return cached_session_id
+        print("Existing login is no longer valid")
+    return None
+
+
+def _save_session_ids() -> None:
+    """Writes the cache of login session IDs to any LOGIN_CACHE_FILE."""
+    if LOGIN_CACHE_FILE:
+        with open(LOGIN_CACHE_FILE, "w", encoding="utf-8") as cache_file:
+            json.dump(_get_session_ids(), cache_file, indent=2)
+
+
+def _run_login_logic_for_cas(
+    browser_context: BrowserContext, *, host_url, user, password
+) -> str:
     """Playwright logic to manage a login via the keycloak federated authentication service
     CAS, returning the session ID. We're given a host URL (i.e. https://example.com),
     a user and a password."""
-    browser = spw.chromium.launch(channel=_PW_LAUNCH_CHANNEL)
-    page = browser.new_page()
+    page = browser_context.new_page()
 
     login_url = f"{host_url}/accounts/login"
     print(f"Logging in using CAS to '{login_url}' (as '{user}')...")
@@ -143,18 +330,15 @@ def _run_login_logic_for_cas(spw: sync_playwright, *, host_url, user, password)
     session_id_value: str = _RE_SESSION_ID.search(raw_text).group(1)
     print(f"Got Session ID ({session_id_value})")
 
-    browser.close()
-
     return session_id_value
 
 
 def _run_login_logic_for_keycloak(
-    spw: sync_playwright, *, host_url, user, password
+    browser_context: BrowserContext, *, host_url, user, password
 ) -> str:
     """Playwright logic to manage a login via Keycloak (directly), returning the session ID.
     We're given a host URL (i.e. https://example.com), a user and a password."""
-    browser = spw.chromium.launch(channel=_PW_LAUNCH_CHANNEL)
-    page = browser.new_page()
+    page = browser_context.new_page()
 
     login_url = f"{host_url}/accounts/login"
     print(f"Logging in using Keycloak to '{login_url}' (as '{user}')...")
@@ -177,18 +361,15 @@ def _run_login_logic_for_keycloak(
     session_id_value: str = _RE_SESSION_ID.search(raw_text).group(1)
     print(f"Got Session ID ({session_id_value})")
 
-    browser.close()
-
     return session_id_value
 
 
 def _run_login_logic_for_keycloak_fragalysis(
-    spw: sync_playwright, *, host_url, user, password
+    browser_context: BrowserContext, *, host_url, user, password
 ) -> str:
     """Playwright logic to manage a login via our custom Keycloak theme, returning the session ID.
     We're given a host URL (i.e. https://example.com), a user and a password."""
-    browser = spw.chromium.launch(channel=_PW_LAUNCH_CHANNEL)
-    page = browser.new_page()
+    page = browser_context.new_page()
 
     login_url = f"{host_url}/accounts/login"
     print(f"Logging in using Keycloak to '{login_url}' (as '{user}')...")
@@ -210,18 +391,15 @@ def _run_login_logic_for_keycloak_fragalysis(
     session_id_value: str = _RE_SESSION_ID.search(raw_text).group(1)
     print(f"Got Session ID ({session_id_value})")
 
-    browser.close()
-
     return session_id_value
 
 
 def _run_login_logic_for_superuser(
-    spw: sync_playwright, *, host_url, user, password
+    browser_context: BrowserContext, *, host_url, user, password
 ) -> str:
     """Playwright logic to manage a login via the Django admin panel.
     There is no session here."""
-    browser = spw.chromium.launch(channel=_PW_LAUNCH_CHANNEL)
-    page = browser.new_page()
+    page = browser_context.new_page()
 
     login_url = f"{host_url}/admin/login"
     print(f"Logging in using Django admin to '{login_url}' (as '{user}')...")
@@ -237,6 +415,4 @@ def _run_login_logic_for_superuser(
     session_id_value: str = _RE_SESSION_ID.search(raw_text).group(1)
     print(f"Got Session ID ({session_id_value})")
 
-    browser.close()
-
     return session_id_value
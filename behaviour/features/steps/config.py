@@ -6,7 +6,7 @@ PLEASE: Coordinate any environment variable changes with the playwright tests.
 """
 
 import os
-from typing import Optional
+from typing import List, Optional
 
 # All of our environment variables have this prefix...
 ENV_PREFIX = "BEHAVIOUR_"
@@ -41,6 +41,25 @@ S3_SECRET_ACCESS_KEY = _get("AWS_SECRET_ACCESS_KEY")
 S3_DEFAULT_REGION = _get("AWS_DEFAULT_REGION")
 S3_ENDPOINT_URL = _get("AWS_ENDPOINT_URL")
 
+# Tuning of the S3 client
+S3_MAX_POOL_CONNECTIONS: int = 16
+S3_CONNECT_TIMEOUT_S: int = 10
+S3_READ_TIMEOUT_S: int = 60
+S3_MAX_RETRY_ATTEMPTS: int = 5
+# Objects are downloaded in chunks (byte ranges) of this size,
+# with up to S3_DOWNLOAD_CONCURRENCY chunks downloaded at a time.
+# The concurrency should not exceed S3_MAX_POOL_CONNECTIONS.
+S3_DOWNLOAD_CHUNK_BYTES: int = int(_get("S3_DOWNLOAD_CHUNK_BYTES", "16777216"))
+S3_DOWNLOAD_CONCURRENCY: int = int(_get("S3_DOWNLOAD_CONCURRENCY", "8"))
+# The directory used to cache objects downloaded from S3 (across runs),
+# and the total size (bytes) of the cached objects before the least-recently used
+# objects are removed. The directory can be restored/saved by CI.
+S3_CACHE_DIR: str = _get("S3_CACHE_DIR", ".s3-cache") or ".s3-cache"
+S3_CACHE_MAX_BYTES: int = int(_get("S3_CACHE_MAX_BYTES", "10737418240"))
+# If 'yes' target archives are not downloaded (or cached), they are streamed
+# from S3 into the stack when they're loaded.
+S3_STREAM_UPLOADS: bool = (_get("S3_STREAM_UPLOADS", "no") or "").lower() == "yes"
+
 # Fragalysis Stack name (used to form the stack's URL), and credentials for a CAS user.
 # The username is also used to form the stack's URL.
 STACK_NAME: Optional[str] = _get("STACK_NAME", "behaviour")
@@ -48,10 +67,82 @@ STACK_USERNAME: Optional[str] = _get("STACK_USERNAME")
 STACK_PASSWORD: Optional[str] = _get("STACK_PASSWORD")
 STACK_CLIENT_ID_SECRET: Optional[str] = _get("STACK_CLIENT_ID_SECRET")
 
+# If 'yes' the 'a new stack' step re-uses an existing stack (resetting its data)
+# rather than wiping and creating it, if the stack was created (by a prior run)
+# with the same variables (i.e. image tag). A fingerprint of the variables used
+# to create each stack is kept in STACK_FINGERPRINT_FILE.
+STACK_REUSE: bool = (_get("STACK_REUSE", "no") or "").lower() == "yes"
+STACK_FINGERPRINT_FILE: str = (
+    _get("STACK_FINGERPRINT_FILE", ".stack-fingerprints.json")
+    or ".stack-fingerprints.json"
+)
+# A comma-separated list of image tags that move (i.e. 'latest') and so can
+# refer to a different image than the one the existing stack was created from.
+# Stacks are never re-used for these tags, they're always wiped and created.
+# Set to an empty string to re-use stacks whatever their tag (at your own risk).
+STACK_MUTABLE_IMAGE_TAGS: List[str] = [
+    tag.strip()
+    for tag in (_get("STACK_MUTABLE_IMAGE_TAGS", "latest,stable") or "").split(",")
+    if tag.strip()
+]
+# If 'yes' the data of a stack is saved (using the AWX SNAPSHOT Job Template)
+# after scenarios tagged '@snapshot.<name>' pass, and restored (instead of
+# running the scenario) if a snapshot exists. The snapshots that have been
+# saved are recorded in STACK_DATA_SNAPSHOT_FILE.
+STACK_DATA_SNAPSHOTS: bool = (_get("STACK_DATA_SNAPSHOTS", "no") or "").lower() == "yes"
+STACK_DATA_SNAPSHOT_FILE: str = (
+    _get("STACK_DATA_SNAPSHOT_FILE", ".stack-data-snapshots.json")
+    or ".stack-data-snapshots.json"
+)
+# The longest time (seconds) we wait for a (new) stack to be ready,
+# i.e. for its landing page and API to respond.
+STACK_READY_TIMEOUT_S: int = int(_get("STACK_READY_TIMEOUT_S", "600"))
+
+# An optional file used to store stack login session IDs between test runs.
+# If set, logins that are still valid on the stack are re-used,
+# avoiding the need to launch a browser (useful in a development loop).
+LOGIN_CACHE_FILE: Optional[str] = _get("LOGIN_CACHE_FILE")
+
+# A comma-separated list of login types (i.e. 'superuser,keycloak') that
+# login using plain HTTP form submission rather than a (playwright) browser.
+# Only 'superuser' and 'keycloak' logins can use HTTP, and a failed HTTP login
+# falls back to using the browser. Set to an empty string to always use a browser.
+HTTP_LOGIN_TYPES: List[str] = [
+    login_type.strip()
+    for login_type in (_get("HTTP_LOGIN_TYPES", "superuser,keycloak") or "").split(",")
+    if login_type.strip()
+]
+
 # General constants
 
-REQUEST_POLL_PERIOD_S: int = 2
 REQUEST_TIMEOUT: int = 8
+# Polling (waiting for something on the stack) starts with a short interval
+# that grows (by the backoff factor) up to the maximum interval.
+# Each interval is randomly adjusted by the jitter fraction.
+POLL_INITIAL_INTERVAL_S: float = 0.25
+POLL_BACKOFF_FACTOR: float = 1.5
+POLL_JITTER: float = 0.1
+POLL_MAX_INTERVAL_S: float = 15.0
+# The maximum number of (keep-alive) connections held in each stack's
+# HTTP connection pool.
+REQUEST_POOL_SIZE: int = int(_get("REQUEST_POOL_SIZE", "10"))
+# The maximum number of requests made at the same time when running
+# '@concurrent' Scenario Outlines (see environment.py).
+CONCURRENT_REQUESTS: int = int(_get("CONCURRENT_REQUESTS", "8"))
+# The maximum number of target files uploaded at the same time
+# by the step that loads several target files.
+CONCURRENT_UPLOADS: int = int(_get("CONCURRENT_UPLOADS", "4"))
+# The request log (a JSON record of each request made to the stack).
+# It is rotated when it reaches REQUEST_LOG_MAX_BYTES (bytes),
+# keeping up to REQUEST_LOG_BACKUPS prior files ('request.log.1' etc.).
+# The log files are compressed (gzip) at the end of the run
+# if BEHAVIOUR_REQUEST_LOG_GZIP is 'yes'.
+REQUEST_LOG_FILE: str = _get("REQUEST_LOG_FILE", "request.log") or "request.log"
+REQUEST_LOG_MAX_BYTES: int = int(_get("REQUEST_LOG_MAX_BYTES", "67108864"))
+REQUEST_LOG_BACKUPS: int = 3
+REQUEST_LOG_GZIP: bool = (_get("REQUEST_LOG_GZIP", "no") or "").lower() == "yes"
+# How long (seconds) a stack's CSRF token is re-used before we get a new one.
+CSRF_TOKEN_TTL_S: int = 600
 
 # To create a stack we need to know the names of templates (in the AWX server)
 # that are responsible for its creation and destruction.
@@ -60,6 +151,16 @@ AWX_STACK_CREATE_JOB_TEMPLATE: str = "User (%(username)s) Behaviour Fragalysis S
 AWX_STACK_WIPE_JOB_TEMPLATE: str = (
     "User (%(username)s) Behaviour Fragalysis Stack [WIPE]"
 )
+# Templates that save (snapshot) and restore a stack's data (database and media),
+# given the name of the snapshot (in the 'stack_data_snapshot' variable).
+AWX_STACK_SNAPSHOT_JOB_TEMPLATE: str = (
+    "User (%(username)s) Behaviour Fragalysis Stack [SNAPSHOT]"
+)
+AWX_STACK_RESTORE_JOB_TEMPLATE: str = (
+    "User (%(username)s) Behaviour Fragalysis Stack [RESTORE]"
+)
+# The longest time (seconds) we wait for an AWX Job to finish.
+AWX_JOB_TIMEOUT_S: int = 3600
 
 
 # Convenience functions for config values
@@ -0,0 +1,135 @@
+"""
+Logging utilities for steps.
+A log writer that writes lines to a file using a background thread,
+so that callers (i.e. every API request) never wait for the file system.
+"""
+
+import atexit
+import gzip
+import os
+import queue
+import shutil
+import threading
+from typing import List, Optional
+
+# The maximum number of lines written to the file at a time
+_BATCH_SIZE: int = 256
+
+
+class BufferedLogWriter:
+    """Writes lines to a log file from a dedicated (background) thread.
+    Lines are queued by write() and the thread writes them in batches,
+    flushing the file whenever the queue is empty. When the file reaches
+    max_bytes it is rotated (i.e. 'request.log' becomes 'request.log.1')
+    keeping up to 'backups' prior files. If gzip_on_close is set the files
+    are compressed when the writer is closed (i.e. 'request.log.1' becomes
+    'request.log.1.gz') and, as the log is appended to, the compressed files
+    of a prior run are rotated when the writer is created. The writer is closed
+    (and the queue flushed) when the process exits, if not before."""
+
+    def __init__(
+        self,
+        filename: str,
+        *,
+        max_bytes: int,
+        backups: int,
+        gzip_on_close: bool = False,
+    ) -> None:
+        self._filename: str = filename
+        self._max_bytes: int = max_bytes
+        self._backups: int = backups
+        self._gzip_on_close: bool = gzip_on_close
+        # Lines to write (None tells the thread to stop)
+        self._queue: queue.SimpleQueue[Optional[str]] = queue.SimpleQueue()
+        self._thread: threading.Thread = threading.Thread(
+            target=self._run, name=f"log-writer ({filename})", daemon=True
+        )
+        self._closed: bool = False
+        # A prior run's (compressed) log makes way for this run's log
+        if gzip_on_close and os.path.exists(f"{filename}.gz"):
+            self._rotate()
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, line: str) -> None:
+        """Queues a line (without its line terminator) to be written."""
+        assert not self._closed
+        self._queue.put(line)
+
+    def close(self) -> None:
+        """Writes any queued lines and closes (and optionally compresses) the file."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        if self._gzip_on_close:
+            self._compress()
+
+    def _run(self) -> None:
+        """The thread's logic, writing batches of queued lines until told to stop."""
+        # pylint: disable=consider-using-with
+        logfile = open(self._filename, "a", encoding="utf-8")
+        stopping: bool = False
+        while not stopping:
+            batch: List[str] = []
+            line: Optional[str] = self._queue.get()
+            while line is not None:
+                batch.append(line)
+                if len(batch) == _BATCH_SIZE or self._queue.empty():
+                    break
+                line = self._queue.get()
+            stopping = line is None
+
+            if batch:
+                logfile.write("\n".join(batch) + "\n")
+            if self._queue.empty() or stopping:
+                logfile.flush()
+            if logfile.tell() >= self._max_bytes:
+                logfile.close()
+                self._rotate()
+                logfile = open(self._filename, "a", encoding="utf-8")
+        logfile.close()
+
+    def _rotate(self) -> None:
+        """Renames the file (and any prior files), i.e. 'request.log.1'
+        becomes 'request.log.2' and 'request.log' becomes 'request.log.1',
+        removing the oldest file. Compressed files (i.e. 'request.log.1.gz')
+        are rotated in the same way."""
+        for backup in range(self._backups, 0, -1):
+            source: str = (
+                f"{self._filename}.{backup - 1}" if backup > 1 else self._filename
+            )
+            sources: List[str] = [
+                suffix for suffix in ("", ".gz") if os.path.exists(f"{source}{suffix}")
+            ]
+            if sources:
+                # The (older) file this replaces may be plain or compressed
+                self._remove(f"{self._filename}.{backup}")
+            for suffix in sources:
+                os.replace(f"{source}{suffix}", f"{self._filename}.{backup}{suffix}")
+        if self._backups == 0:
+            self._remove(self._filename)
+
+    @staticmethod
+    def _remove(filename: str) -> None:
+        """Removes the file, and its compressed file, if they exist."""
+        for suffix in ("", ".gz"):
+            if os.path.exists(f"{filename}{suffix}"):
+                os.remove(f"{filename}{suffix}")
+
+    def _compress(self) -> None:
+        """Compresses the file (and any prior files), replacing them with '.gz' files."""
+        filenames: List[str] = [self._filename] + [
+            f"{self._filename}.{backup}" for backup in range(1, self._backups + 1)
+        ]
+        for filename in filenames:
+            if not os.path.exists(filename):
+                continue
+            # Appended (as a new gzip member) so nothing already compressed is lost
+            with (
+                open(filename, "rb") as source,
+                gzip.open(f"{filename}.gz", "ab") as destination,
+            ):
+                shutil.copyfileobj(source, destination)
+            os.remove(filename)
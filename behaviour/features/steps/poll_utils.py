@@ -0,0 +1,77 @@
+"""
+Polling utilities for steps.
+Logic that allows steps to wait for something on the stack (i.e. a task) to finish.
+"""
+
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import timedelta
+from typing import Any, Callable, List, Tuple
+
+from config import (
+    POLL_BACKOFF_FACTOR,
+    POLL_INITIAL_INTERVAL_S,
+    POLL_JITTER,
+    POLL_MAX_INTERVAL_S,
+)
+
+
+@dataclass
+class PollResult:
+    """The result of a call to poll()."""
+
+    # True if the probe reported 'done' before the timeout
+    done: bool
+    # The value returned by the last call to the probe
+    value: Any
+    # The time (seconds) taken by each call to the probe
+    latencies_s: List[float] = field(default_factory=list)
+
+
+def get_timeout_period(timeout: int, timeout_units: str) -> timedelta:
+    """Returns the timeout period for a step's timeout value and units
+    (which can be 'minute', 'minutes', 'second' or 'seconds')."""
+    assert timeout > 0
+    assert timeout_units in ["minute", "minutes", "second", "seconds"]
+    if timeout_units.startswith("minute"):
+        return timedelta(minutes=timeout)
+    return timedelta(seconds=timeout)
+
+
+def poll(
+    probe: Callable[[], Tuple[bool, Any]],
+    *,
+    timeout: timedelta,
+    initial_interval_s: float = POLL_INITIAL_INTERVAL_S,
+    backoff_factor: float = POLL_BACKOFF_FACTOR,
+    jitter: float = POLL_JITTER,
+    max_interval_s: float = POLL_MAX_INTERVAL_S,
+) -> PollResult:
+    """Repeatedly calls the probe until it returns 'done' (a tuple of 'done' and
+    a value) or the timeout expires. The first interval between calls is short
+    and it grows by the backoff factor (up to the maximum interval), each interval
+    randomly adjusted by the jitter fraction (i.e. 0.1 is +/-10%).
+    We never sleep beyond the timeout, and the probe is always called
+    (one last time) when the timeout expires."""
+    deadline: float = time.monotonic() + timeout.total_seconds()
+    interval_s: float = initial_interval_s
+    latencies_s: List[float] = []
+    while True:
+        probe_start: float = time.monotonic()
+        done, value = probe()
+        now: float = time.monotonic()
+        latencies_s.append(now - probe_start)
+        if done or now >= deadline:
+            break
+
+        sleep_s: float = interval_s * random.uniform(1.0 - jitter, 1.0 + jitter)
+        time.sleep(min(sleep_s, deadline - now))
+        interval_s = min(interval_s * backoff_factor, max_interval_s)
+
+    print(
+        f"Polled {len(latencies_s)} times"
+        f" (mean latency {sum(latencies_s) / len(latencies_s):.3f}s,"
+        f" max latency {max(latencies_s):.3f}s)"
+    )
+    return PollResult(done=done, value=value, latencies_s=latencies_s)
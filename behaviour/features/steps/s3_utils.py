@@ -1,30 +1,52 @@
 #!/usr/bin/env python
 """Utilities for interacting with S3,
 relying on AWS S3 environment variables with a BEHAVIOUR_ prefix."""
+import hashlib
+import json
 import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
 import boto3
+from botocore.config import Config
 from config import (
     S3_ACCESS_KEY_ID,
+    S3_CACHE_DIR,
+    S3_CACHE_MAX_BYTES,
+    S3_CONNECT_TIMEOUT_S,
     S3_DEFAULT_REGION,
+    S3_DOWNLOAD_CHUNK_BYTES,
+    S3_DOWNLOAD_CONCURRENCY,
     S3_ENDPOINT_URL,
+    S3_MAX_POOL_CONNECTIONS,
+    S3_MAX_RETRY_ATTEMPTS,
+    S3_READ_TIMEOUT_S,
     S3_SECRET_ACCESS_KEY,
     get_env_name,
 )
 
+# S3 clients, keyed by endpoint, region and access key ID.
+# Created on demand by _get_s3_client().
+_S3_CLIENTS: Dict[Tuple[Optional[str], Optional[str], Optional[str]], Any] = {}
+_S3_CLIENTS_LOCK: threading.Lock = threading.Lock()
+
+# The name of the S3 cache's manifest file,
+# a record of each cached object (keyed by its cache directory name).
+_CACHE_MANIFEST: str = "manifest.json"
+# Held while (any thread is) reading or updating a cache's manifest
+_CACHE_MANIFEST_LOCK: threading.Lock = threading.Lock()
+# Held while (a thread is) getting an object into the cache, one for each
+# cache entry (keyed by cache directory and entry name), so that only one
+# thread downloads an object. Created (under the manifest lock) when needed.
+_CACHE_ENTRY_LOCKS: Dict[Tuple[str, str], threading.Lock] = {}
+
 
 def check_bucket(bucket: str) -> None:
     """Checks we can access the bucket (we simply check its location)"""
-    _check_env()
-
-    print(f"Creating S3 client (url={S3_ENDPOINT_URL})...")
-    s3 = boto3.client(
-        "s3",
-        region_name=S3_DEFAULT_REGION,
-        aws_access_key_id=S3_ACCESS_KEY_ID,
-        aws_secret_access_key=S3_SECRET_ACCESS_KEY,
-        endpoint_url=S3_ENDPOINT_URL,
-    )
+    s3 = _get_s3_client()
 
     print("Checking bucket location...")
     resp = s3.get_bucket_location(Bucket=bucket)
@@ -32,29 +54,327 @@ def check_bucket(bucket: str) -> None:
     print("Success")
 
 
-def get_object(bucket: str, key: str, destination_dir: str = ".") -> None:
-    """Get an object from an S3 bucket, placing it in the destination directory"""
-    _check_env()
+def get_object(
+    bucket: str,
+    key: str,
+    destination_dir: str = ".",
+    *,
+    chunk_bytes: int = S3_DOWNLOAD_CHUNK_BYTES,
+    concurrency: int = S3_DOWNLOAD_CONCURRENCY,
+) -> float:
+    """Get an object from an S3 bucket, placing it in the destination directory.
+    Large objects are downloaded as concurrent byte-range GETs (chunks),
+    each written to its place in a pre-allocated file.
+    Returns the download rate (MiB/s), so downloads can be benchmarked."""
+    assert chunk_bytes > 0
+    assert concurrency > 0
+    s3 = _get_s3_client()
 
-    print(f"Creating S3 client (url={S3_ENDPOINT_URL})...")
-    s3 = boto3.client(
-        "s3",
-        region_name=S3_DEFAULT_REGION,
-        aws_access_key_id=S3_ACCESS_KEY_ID,
-        aws_secret_access_key=S3_SECRET_ACCESS_KEY,
-        endpoint_url=S3_ENDPOINT_URL,
+    print(f"Downloading {bucket}/{key} to {destination_dir}...")
+    head = s3.head_object(Bucket=bucket, Key=key)
+    return _download_object(
+        s3,
+        bucket=bucket,
+        key=key,
+        head=head,
+        destination_file=os.path.join(destination_dir, key),
+        chunk_bytes=chunk_bytes,
+        concurrency=concurrency,
     )
 
-    print(f"Downloading {bucket}/{key} to {destination_dir}...")
-    destination_file: str = os.path.join(destination_dir, key)
-    with open(destination_file, "wb") as f:
-        s3.download_fileobj(bucket, key, f)
-    print("Downloaded")
+
+class S3ObjectStream:
+    """A readable stream of an S3 object's content, which (unlike the
+    underlying botocore StreamingBody) has a 'len' (the number of bytes
+    not yet read), allowing it to be used as a MultipartEncoder file."""
+
+    def __init__(self, body: Any, size: int) -> None:
+        self._body: Any = body
+        self._remaining: int = size
+
+    @property
+    def len(self) -> int:
+        """The number of bytes not yet read."""
+        return self._remaining
+
+    def read(self, length: int = -1) -> bytes:
+        """Reads (up to) length bytes (or all the remaining bytes)."""
+        data: bytes = self._body.read(None if length < 0 else length)
+        self._remaining -= len(data)
+        return data
+
+    def close(self) -> None:
+        """Closes the stream (releasing its connection)."""
+        self._body.close()
+
+
+def open_object_stream(bucket: str, key: str) -> S3ObjectStream:
+    """Opens a stream of an object in an S3 bucket (without downloading it).
+    The caller is expected to close the stream."""
+    s3 = _get_s3_client()
+
+    print(f"Opening stream of {bucket}/{key}...")
+    resp = s3.get_object(Bucket=bucket, Key=key)
+    return S3ObjectStream(resp["Body"], resp["ContentLength"])
+
+
+def get_cached_object(
+    bucket: str,
+    key: str,
+    *,
+    cache_dir: str = S3_CACHE_DIR,
+    max_bytes: int = S3_CACHE_MAX_BYTES,
+) -> str:
+    """Gets an object from an S3 bucket using a local cache, returning the path
+    to the (cached) file. Objects are cached in a directory named after their
+    content (ETag and size) and the cache is revalidated (with a HEAD request)
+    every time, so a changed object is downloaded again. Objects are downloaded to
+    a temporary file that's renamed when complete, so an interrupted download is
+    never used. Least-recently used objects are removed when the cache is full.
+    If several threads get the same object only the first downloads it."""
+    s3 = _get_s3_client()
+
+    head = s3.head_object(Bucket=bucket, Key=key)
+    entry_name: str = hashlib.sha256(
+        f"{bucket}/{key}|{head['ETag']}|{head['ContentLength']}".encode()
+    ).hexdigest()
+    cached_file: str = os.path.join(cache_dir, entry_name, key)
+
+    with _CACHE_MANIFEST_LOCK:
+        entry_lock: threading.Lock = _CACHE_ENTRY_LOCKS.setdefault(
+            (cache_dir, entry_name), threading.Lock()
+        )
+
+    # Threads getting the same object wait for the first to download it
+    with entry_lock:
+        with _CACHE_MANIFEST_LOCK:
+            cached: bool = entry_name in _load_cache_manifest(cache_dir)
+        if cached:
+            print(f"Using cached {bucket}/{key} ({cached_file})")
+        else:
+            print(f"Downloading {bucket}/{key} to the cache ({cache_dir})...")
+            os.makedirs(os.path.dirname(cached_file), exist_ok=True)
+            _download_object(
+                s3,
+                bucket=bucket,
+                key=key,
+                head=head,
+                destination_file=cached_file,
+                chunk_bytes=S3_DOWNLOAD_CHUNK_BYTES,
+                concurrency=S3_DOWNLOAD_CONCURRENCY,
+            )
+
+        # The manifest is re-loaded, as it may have changed during the download
+        with _CACHE_MANIFEST_LOCK:
+            manifest: Dict[str, Dict[str, Any]] = _load_cache_manifest(cache_dir)
+            manifest[entry_name] = {
+                "bucket": bucket,
+                "key": key,
+                "etag": head["ETag"],
+                "size": head["ContentLength"],
+                "last_used": time.time(),
+            }
+            _evict_cache_entries(
+                cache_dir, manifest, max_bytes=max_bytes, keep=entry_name
+            )
+            _save_cache_manifest(cache_dir, manifest)
+    return cached_file
 
 
 # Local functions
 
 
+class _DownloadProgress:  # pylint: disable=too-few-public-methods
+    """Counts the bytes downloaded (by any thread),
+    printing the progress every 10%."""
+
+    def __init__(self, size: int) -> None:
+        self._size: int = size
+        self._downloaded: int = 0
+        self._reported_percent: int = 0
+        self._lock: threading.Lock = threading.Lock()
+
+    def add(self, num_bytes: int) -> None:
+        """Adds to the bytes downloaded."""
+        with self._lock:
+            self._downloaded += num_bytes
+            percent: int = self._downloaded * 100 // self._size
+            if percent >= self._reported_percent + 10:
+                self._reported_percent = percent - percent % 10
+                print(f"Downloaded {self._reported_percent}%...")
+
+
+def _download_object(
+    s3: Any,
+    *,
+    bucket: str,
+    key: str,
+    head: Dict[str, Any],
+    destination_file: str,
+    chunk_bytes: int,
+    concurrency: int,
+) -> float:
+    """Downloads an object (described by the response to a HEAD request)
+    to a pre-allocated temporary file that's renamed (to the destination file)
+    only when it's complete. Returns the download rate (MiB/s)."""
+    size: int = head["ContentLength"]
+    ranges: List[Tuple[int, int]] = [
+        (start, min(start + chunk_bytes, size) - 1)
+        for start in range(0, size, chunk_bytes)
+    ]
+
+    start_time: float = time.monotonic()
+    partial_file: str = f"{destination_file}.part"
+    with open(partial_file, "wb") as f:
+        f.truncate(size)
+        _get_object_ranges(
+            s3,
+            bucket=bucket,
+            key=key,
+            etag=head["ETag"],
+            ranges=ranges,
+            fileno=f.fileno(),
+            concurrency=concurrency,
+        )
+    os.replace(partial_file, destination_file)
+    elapsed_s: float = max(time.monotonic() - start_time, 1e-6)
+
+    rate_mib_s: float = size / elapsed_s / 1048576
+    print(
+        f"Downloaded {size} bytes in {len(ranges)} chunks"
+        f" ({elapsed_s:.1f}s, {rate_mib_s:.1f} MiB/s)"
+    )
+    return rate_mib_s
+
+
+def _load_cache_manifest(cache_dir: str) -> Dict[str, Dict[str, Any]]:
+    """Loads the cache's manifest, discarding entries for objects whose file is
+    missing or of the wrong size (i.e. a partially restored cache)."""
+    manifest_file: str = os.path.join(cache_dir, _CACHE_MANIFEST)
+    if not os.path.isfile(manifest_file):
+        return {}
+    with open(manifest_file, encoding="utf-8") as f:
+        manifest: Dict[str, Dict[str, Any]] = json.load(f)
+    return {
+        entry_name: entry
+        for entry_name, entry in manifest.items()
+        if os.path.isfile(
+            cached_file := os.path.join(cache_dir, entry_name, entry["key"])
+        )
+        and os.path.getsize(cached_file) == entry["size"]
+    }
+
+
+def _save_cache_manifest(cache_dir: str, manifest: Dict[str, Dict[str, Any]]) -> None:
+    """Saves the cache's manifest (replacing the existing file in one step)."""
+    manifest_file: str = os.path.join(cache_dir, _CACHE_MANIFEST)
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(f"{manifest_file}.part", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(f"{manifest_file}.part", manifest_file)
+
+
+def _evict_cache_entries(
+    cache_dir: str, manifest: Dict[str, Dict[str, Any]], *, max_bytes: int, keep: str
+) -> None:
+    """Removes the least-recently used objects from the cache (and manifest)
+    until the cached objects fit in max_bytes. The 'keep' entry is never removed."""
+    total_bytes: int = sum(entry["size"] for entry in manifest.values())
+    for entry_name in sorted(manifest, key=lambda name: manifest[name]["last_used"]):
+        if total_bytes <= max_bytes:
+            break
+        if entry_name == keep:
+            continue
+        entry = manifest.pop(entry_name)
+        print(f"Removing cached {entry['bucket']}/{entry['key']}")
+        shutil.rmtree(os.path.join(cache_dir, entry_name), ignore_errors=True)
+        total_bytes -= entry["size"]
+
+
+def _get_object_ranges(
+    s3: Any,
+    *,
+    bucket: str,
+    key: str,
+    etag: str,
+    ranges: List[Tuple[int, int]],
+    fileno: int,
+    concurrency: int,
+) -> None:
+    """Gets the ranges of an object's bytes, concurrently, writing them to the
+    (open and pre-allocated) file. The ETag is used to make sure every range
+    comes from the same object."""
+    progress = _DownloadProgress(ranges[-1][1] + 1 if ranges else 0)
+    with ThreadPoolExecutor(max_workers=max(1, min(concurrency, len(ranges)))) as pool:
+        futures = [
+            pool.submit(
+                _get_object_range,
+                s3,
+                bucket=bucket,
+                key=key,
+                etag=etag,
+                byte_range=byte_range,
+                fileno=fileno,
+                progress=progress,
+            )
+            for byte_range in ranges
+        ]
+        # Raises the first failure (if any)
+        for future in futures:
+            future.result()
+
+
+def _get_object_range(
+    s3: Any,
+    *,
+    bucket: str,
+    key: str,
+    etag: str,
+    byte_range: Tuple[int, int],
+    fileno: int,
+    progress: _DownloadProgress,
+) -> None:
+    """Gets a range of an object's bytes (first and last, inclusive),
+    writing them at the same offset in the (open) file."""
+    first, last = byte_range
+    resp = s3.get_object(
+        Bucket=bucket, Key=key, Range=f"bytes={first}-{last}", IfMatch=etag
+    )
+    offset: int = first
+    for data in resp["Body"].iter_chunks(chunk_size=1048576):
+        os.pwrite(fileno, data, offset)
+        offset += len(data)
+        progress.add(len(data))
+    assert offset == last + 1
+
+
+def _get_s3_client() -> Any:
+    """Returns the S3 client (shared by all the S3 steps),
+    creating it if necessary."""
+    _check_env()
+
+    key = (S3_ENDPOINT_URL, S3_DEFAULT_REGION, S3_ACCESS_KEY_ID)
+    with _S3_CLIENTS_LOCK:
+        if key in _S3_CLIENTS:
+            return _S3_CLIENTS[key]
+
+        print(f"Creating S3 client (url={S3_ENDPOINT_URL})...")
+        _S3_CLIENTS[key] = boto3.client(
+            "s3",
+            region_name=S3_DEFAULT_REGION,
+            aws_access_key_id=S3_ACCESS_KEY_ID,
+            aws_secret_access_key=S3_SECRET_ACCESS_KEY,
+            endpoint_url=S3_ENDPOINT_URL,
+            config=Config(
+                max_pool_connections=S3_MAX_POOL_CONNECTIONS,
+                connect_timeout=S3_CONNECT_TIMEOUT_S,
+                read_timeout=S3_READ_TIMEOUT_S,
+                retries={"max_attempts": S3_MAX_RETRY_ATTEMPTS, "mode": "standard"},
+            ),
+        )
+    return _S3_CLIENTS[key]
+
+
 def _check_env() -> None:
     """Check that required environment variables are set"""
     if S3_SECRET_ACCESS_KEY is None or S3_SECRET_ACCESS_KEY == "":
@@ -0,0 +1,358 @@
+"""
+Stack utilities for steps.
+Logic that allows us to create a stack (in the background if required),
+or re-use an existing stack (resetting its data) rather than wiping
+and creating it again, and to save and restore a stack's data.
+"""
+
+import ast
+import hashlib
+import http
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+from api_utils import api_post_request, api_request, forget_object_ids
+from awx_utils import launch_awx_job_template
+from browser_utils import login
+from config import (
+    AWX_STACK_CREATE_JOB_TEMPLATE,
+    AWX_STACK_RESTORE_JOB_TEMPLATE,
+    AWX_STACK_SNAPSHOT_JOB_TEMPLATE,
+    AWX_STACK_WIPE_JOB_TEMPLATE,
+    DJANGO_SUPERUSER_PASSWORD,
+    STACK_DATA_SNAPSHOT_FILE,
+    STACK_DATA_SNAPSHOTS,
+    STACK_FINGERPRINT_FILE,
+    STACK_MUTABLE_IMAGE_TAGS,
+    STACK_READY_TIMEOUT_S,
+    STACK_REUSE,
+    get_stack_client_id_secret,
+    get_stack_url,
+    get_stack_username,
+)
+from poll_utils import poll
+
+# The stack endpoint used to check the stack's alive
+_LANDING_PAGE_ENDPOINT: str = "/viewer/react/landing/"
+# The stack endpoint used to remove its data
+_RESET_ENDPOINT: str = "/api/reset/"
+
+# The (anonymous) stack endpoints that must respond (OK) before the stack is ready,
+# i.e. the landing page (the front-end), the API, and the API's database.
+_READINESS_ENDPOINTS: List[str] = [
+    _LANDING_PAGE_ENDPOINT,
+    "/api/tag_category/",
+    "/api/targets/",
+]
+
+# The time (seconds) each stack (URL) took to become ready
+_STACK_READY_TIMES: Dict[str, float] = {}
+
+# Stacks being created (in the background), keyed by stack name.
+# Each value is the Future of the stack's creation.
+_STACK_CREATIONS: Dict[str, Future] = {}
+
+
+def get_stack_extra_vars(
+    stack_name: str, *, stack_image_tag: str, step_text: Optional[str] = None
+) -> Dict[str, Any]:
+    """Returns the variables used to create a stack (passed to the AWX Job
+    Templates). The step text (a Dictionary encoded set of variables) is
+    merged in, if provided."""
+
+    # The stack Client ID can be manufactured.
+    # For developer stacks it looks like this: -
+    #  "fragalysis-[awx-username]-[stack-name]-xchem-dev"
+    #
+    # So alan's behaviour stack client ID will be: -
+    #  "fragalysis-alan-behaviour-xchem-dev"
+
+    stack_oidc_rp_client_id: str = (
+        f"fragalysis-{get_stack_username().lower()}-{stack_name}-xchem-dev"
+    )
+
+    assert DJANGO_SUPERUSER_PASSWORD
+    extra_vars: Dict[str, Any] = {
+        "stack_django_superuser_password": DJANGO_SUPERUSER_PASSWORD,
+        "stack_name": stack_name,
+        "stack_image_tag": stack_image_tag,
+        "stack_oidc_rp_client_id": stack_oidc_rp_client_id,
+        "stack_oidc_rp_client_secret": get_stack_client_id_secret(),
+    }
+
+    # If the user has passed in extra variables, merge them in.
+    if step_text:
+        print(step_text)
+        step_vars = ast.literal_eval(step_text)
+        extra_vars |= step_vars
+        print(f"Using step text as extra variables: {step_vars}")
+
+    return extra_vars
+
+
+def start_stack_creation(stack_name: str, *, extra_vars: Dict[str, Any]) -> Future:
+    """Starts creating (wiping and creating) a stack in the background,
+    returning the Future of its creation. Use wait_for_stack() to wait for it.
+
+    If BEHAVIOUR_STACK_REUSE is 'yes' and the stack was created with the same
+    variables (and is running) its data is reset (before we return)
+    rather than the stack being wiped and created again. Stacks using
+    a mutable image tag (i.e. 'latest') are never re-used."""
+    assert stack_name not in _STACK_CREATIONS
+
+    stack_url: str = get_stack_url(stack_name)
+    fingerprint: str = get_stack_fingerprint(extra_vars)
+    if (
+        STACK_REUSE
+        and is_stack_reusable(
+            stack_url,
+            fingerprint=fingerprint,
+            image_tag=extra_vars["stack_image_tag"],
+        )
+        and reset_stack(stack_url)
+    ):
+        print(f"Re-using (reset) stack '{stack_name}'")
+        creation: Future = Future()
+        creation.set_result(None)
+    else:
+        print(f"Creating stack '{stack_name}' (in the background)...")
+        creation = _run_in_background(
+            _wipe_and_create_stack,
+            stack_url,
+            fingerprint=fingerprint,
+            extra_vars=extra_vars,
+        )
+    _STACK_CREATIONS[stack_name] = creation
+    return creation
+
+
+def wait_for_stack(stack_name: str) -> None:
+    """Waits for the creation of a stack (started by start_stack_creation())
+    to finish, raising any error that prevented its creation.
+    Does nothing if the stack is not being created."""
+    if creation := _STACK_CREATIONS.pop(stack_name, None):
+        print(f"Waiting for stack '{stack_name}'...")
+        creation.result()
+
+
+def get_stack_fingerprint(extra_vars: Dict[str, Any]) -> str:
+    """Returns a fingerprint (a hash) of the variables used to create a stack,
+    which does not reveal the values of the variables (some are secrets)."""
+    return hashlib.sha256(json.dumps(extra_vars, sort_keys=True).encode()).hexdigest()
+
+
+def is_stack_reusable(stack_url: str, *, fingerprint: str, image_tag: str) -> bool:
+    """Returns True if the stack was created with the variables of the given
+    fingerprint (as recorded by record_stack_fingerprint()) and is running.
+    Stacks using a mutable image tag (see BEHAVIOUR_STACK_MUTABLE_IMAGE_TAGS)
+    are never reusable, as the tag may now refer to a newer image."""
+    if image_tag in STACK_MUTABLE_IMAGE_TAGS:
+        print(f"Stack {stack_url} uses a mutable image tag ({image_tag})")
+        return False
+    if _load_stack_fingerprints().get(stack_url) != fingerprint:
+        print(f"Stack {stack_url} was not created with the same variables")
+        return False
+
+    try:
+        resp = api_request(
+            base_url=stack_url, method="GET", endpoint=_LANDING_PAGE_ENDPOINT
+        )
+    except requests.RequestException as ex:
+        print(f"Stack {stack_url} is not running ({ex})")
+        return False
+    if resp.status_code != http.HTTPStatus.OK:
+        print(f"Stack {stack_url} is not running ({resp.status_code})")
+        return False
+    return True
+
+
+def record_stack_fingerprint(stack_url: str, fingerprint: Optional[str]) -> None:
+    """Records the fingerprint of the variables used to create the stack,
+    or removes the record if the fingerprint is None (i.e. while it's being wiped).
+    Fingerprints are only needed to re-use stacks (or restore their data),
+    so unless either is enabled we only remove any (now stale) record
+    and never create the file."""
+    if not (STACK_REUSE or STACK_DATA_SNAPSHOTS) and (
+        fingerprint is not None or not os.path.isfile(STACK_FINGERPRINT_FILE)
+    ):
+        return
+    fingerprints: Dict[str, str] = _load_stack_fingerprints()
+    if fingerprint is None:
+        fingerprints.pop(stack_url, None)
+    else:
+        fingerprints[stack_url] = fingerprint
+    _save_json(STACK_FINGERPRINT_FILE, fingerprints)
+
+
+def wait_for_stack_readiness(
+    stack_url: str, *, timeout_s: int = STACK_READY_TIMEOUT_S
+) -> bool:
+    """Waits for the stack to be ready, i.e. for each of its readiness endpoints
+    to respond OK (connection errors simply mean the stack is not ready),
+    returning True if the stack is ready within the timeout. The time taken
+    is recorded (and printed by print_stack_readiness_report())."""
+    print(f"Waiting for stack {stack_url} to be ready...")
+    start_time: float = time.monotonic()
+
+    def readiness_probe() -> Tuple[bool, List[str]]:
+        not_ready: List[str] = []
+        for endpoint in _READINESS_ENDPOINTS:
+            try:
+                resp = api_request(base_url=stack_url, method="GET", endpoint=endpoint)
+                if resp.status_code != http.HTTPStatus.OK:
+                    not_ready.append(f"{endpoint} ({resp.status_code})")
+            except requests.RequestException as ex:
+                not_ready.append(f"{endpoint} ({type(ex).__name__})")
+        return not not_ready, not_ready
+
+    result = poll(readiness_probe, timeout=timedelta(seconds=timeout_s))
+    if not result.done:
+        print(f"Stack {stack_url} is not ready: {', '.join(result.value)}")
+        return False
+
+    _STACK_READY_TIMES[stack_url] = time.monotonic() - start_time
+    print(f"Stack {stack_url} ready in {_STACK_READY_TIMES[stack_url]:.1f}s")
+    return True
+
+
+def print_stack_readiness_report() -> None:
+    """Prints the time each stack took to be ready."""
+    if not _STACK_READY_TIMES:
+        return
+
+    print("Stack time-to-ready (seconds): -")
+    for stack_url, ready_s in _STACK_READY_TIMES.items():
+        print(f"{ready_s:>8.1f}  {stack_url}")
+
+
+def reset_stack(stack_url: str) -> bool:
+    """Removes the stack's data (as the superuser),
+    returning True if the stack reports success."""
+    print(f"Resetting stack {stack_url}...")
+    session_id: str = login(stack_url, login_type="superuser")
+    resp = api_post_request(
+        base_url=stack_url, endpoint=_RESET_ENDPOINT, session_id=session_id
+    )
+    if not resp.ok:
+        print(f"Failed to reset stack {stack_url} ({resp.status_code})")
+        return False
+    return True
+
+
+def get_stack_data_snapshot(stack_name: str, name: str) -> Optional[str]:
+    """Returns the name of the snapshot of the stack's data with the given name.
+    The snapshot name includes (part of) the fingerprint of the variables the
+    stack was created with, so snapshots are never restored into a stack
+    created from a different image. Returns None if the stack's creation
+    was not recorded."""
+    fingerprint: Optional[str] = _load_stack_fingerprints().get(
+        get_stack_url(stack_name)
+    )
+    return f"{name}-{fingerprint[:16]}" if fingerprint else None
+
+
+def has_stack_data_snapshot(snapshot: str) -> bool:
+    """Returns True if the snapshot has been saved (by save_stack_data())."""
+    return snapshot in _load_json(STACK_DATA_SNAPSHOT_FILE)
+
+
+def save_stack_data(stack_name: str, snapshot: str) -> None:
+    """Saves (snapshots) the stack's data (using the AWX SNAPSHOT Job Template),
+    recording the snapshot."""
+    print(f"Saving the data of stack '{stack_name}' ({snapshot})...")
+    snapshot_jt = AWX_STACK_SNAPSHOT_JOB_TEMPLATE % {
+        "username": get_stack_username().capitalize()
+    }
+    launch_awx_job_template(
+        snapshot_jt,
+        extra_vars={"stack_name": stack_name, "stack_data_snapshot": snapshot},
+    )
+
+    snapshots: Dict[str, Any] = _load_json(STACK_DATA_SNAPSHOT_FILE)
+    snapshots[snapshot] = time.time()
+    _save_json(STACK_DATA_SNAPSHOT_FILE, snapshots)
+
+
+def restore_stack_data(stack_name: str, snapshot: str) -> None:
+    """Restores the stack's data from a snapshot
+    (using the AWX RESTORE Job Template)."""
+    print(f"Restoring the data of stack '{stack_name}' ({snapshot})...")
+    restore_jt = AWX_STACK_RESTORE_JOB_TEMPLATE % {
+        "username": get_stack_username().capitalize()
+    }
+    launch_awx_job_template(
+        restore_jt,
+        extra_vars={"stack_name": stack_name, "stack_data_snapshot": snapshot},
+    )
+
+    # Objects (and their IDs) in the stack may have changed.
+    forget_object_ids(base_url=get_stack_url(stack_name))
+
+
+# Local functions
+
+
+def _run_in_background(function: Callable[..., Any], *args, **kwargs) -> Future:
+    """Runs the function in a new (daemon) thread, returning its Future.
+    We don't use an Executor as its threads are waited for when the
+    interpreter exits, so a stack creation abandoned by a failed scenario
+    would delay the end of the run (by up to AWX_JOB_TIMEOUT_S)."""
+    future: Future = Future()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(function(*args, **kwargs))
+        except BaseException as ex:  # pylint: disable=broad-exception-caught
+            future.set_exception(ex)
+
+    threading.Thread(target=run, name="stack-creation", daemon=True).start()
+    return future
+
+
+def _wipe_and_create_stack(
+    stack_url: str, *, fingerprint: str, extra_vars: Dict[str, Any]
+) -> None:
+    """Wipes and creates the stack (using the AWX Job Templates),
+    recording the fingerprint of the variables used to create it."""
+    # The stack's no longer the one we recorded (even if the wipe fails)
+    record_stack_fingerprint(stack_url, None)
+
+    wipe_jt = AWX_STACK_WIPE_JOB_TEMPLATE % {
+        "username": get_stack_username().capitalize()
+    }
+    launch_awx_job_template(wipe_jt, extra_vars=extra_vars)
+
+    create_jt = AWX_STACK_CREATE_JOB_TEMPLATE % {
+        "username": get_stack_username().capitalize()
+    }
+    launch_awx_job_template(create_jt, extra_vars=extra_vars)
+
+    record_stack_fingerprint(stack_url, fingerprint)
+
+
+def _load_stack_fingerprints() -> Dict[str, str]:
+    """Loads the stack fingerprints (keyed by stack URL)."""
+    return _load_json(STACK_FINGERPRINT_FILE)
+
+
+def _load_json(filename: str) -> Dict[str, Any]:
+    """Loads a JSON file (a dictionary), which may not exist."""
+    if not os.path.isfile(filename):
+        return {}
+    with open(filename, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_json(filename: str, content: Dict[str, Any]) -> None:
+    """Saves a JSON file (replacing any existing file in one step)."""
+    with open(f"{filename}.part", "w", encoding="utf-8") as f:
+        json.dump(content, f, indent=2)
+    os.replace(f"{filename}.part", filename)
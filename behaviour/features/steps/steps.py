@@ -24,38 +24,44 @@ import ast
 import http
 import os
 import time
-import urllib.parse
-from datetime import datetime, timedelta
-from typing import Any, Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, closing
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 
 import requests
 from api_utils import (
     api_delete_request,
+    api_get_paginated_results,
     api_get_request,
     api_post_request,
+    api_request,
     create_session_project,
     create_snapshot,
+    forget_object_ids,
+    get_last_object,
+    get_object_id,
     initiate_job_file_transfer,
     initiate_job_request,
     upload_target_experiment,
 )
-from awx_utils import launch_awx_job_template
 from behave import given, then, when
 from browser_utils import login
 from config import (
-    AWX_STACK_CREATE_JOB_TEMPLATE,
-    AWX_STACK_WIPE_JOB_TEMPLATE,
-    DJANGO_SUPERUSER_PASSWORD,
-    REQUEST_POLL_PERIOD_S,
+    CONCURRENT_UPLOADS,
     REQUEST_TIMEOUT,
-    get_stack_client_id_secret,
+    S3_STREAM_UPLOADS,
     get_stack_name,
     get_stack_url,
-    get_stack_username,
 )
-from s3_utils import check_bucket, get_object
-
-_DOWNLOAD_PATH = "."
+from poll_utils import get_timeout_period, poll
+from s3_utils import check_bucket, get_cached_object, open_object_stream
+from stack_utils import (
+    get_stack_extra_vars,
+    start_stack_creation,
+    wait_for_stack,
+    wait_for_stack_readiness,
+)
 
 
 @given(  # pylint: disable=not-callable
@@ -69,50 +75,69 @@ def a_new_stack_using_the_image_tag_x(context, stack_image_tag) -> None:
     The step relies on the image and tag from the Job Template,
     or the content of any step Doc-string variables.
 
+    If BEHAVIOUR_STACK_REUSE is 'yes' and the stack was created with the same
+    variables (and is running) its data is reset rather than the stack
+    being wiped and created again.
+
     If successful it sets the following context members: -
     - stack_name (e.g. 'behaviour')
     """
     assert context.failed is False
 
     stack_name = get_stack_name()
-    print(f"Creating stack '{stack_name}'...")
+    extra_vars = get_stack_extra_vars(
+        stack_name, stack_image_tag=stack_image_tag, step_text=context.text
+    )
+    start_stack_creation(stack_name, extra_vars=extra_vars)
+    wait_for_stack(stack_name)
+
+    # Objects (and their IDs) on any prior stack have gone.
+    forget_object_ids(base_url=get_stack_url(stack_name))
+
+    context.stack_name = stack_name
+    print(f"Created stack '{stack_name}'")
 
-    # The stack Client ID can be manufactured.
-    # For developer stacks it looks like this: -
-    #  "fragalysis-[awx-username]-[stack-name]-xchem-dev"
-    #
-    # So alan's behaviour stack client ID will be: -
-    #  "fragalysis-alan-behaviour-xchem-dev"
 
-    stack_oidc_rp_client_id: str = (
-        f"fragalysis-{get_stack_username().lower()}-{stack_name}-xchem-dev"
+@given(  # pylint: disable=not-callable
+    'a new stack is being created using the image tag "{stack_image_tag}"'
+)
+def a_new_stack_is_being_created_using_the_image_tag_x(
+    context, stack_image_tag
+) -> None:
+    """Like 'a new stack using the image tag', but the stack is created in the
+    background, so that the steps that follow (that do not need the stack,
+    like getting files from a bucket) can run while the stack is created.
+    Use the step 'the new stack is ready' to wait for the stack.
+
+    Sets the following context members: -
+    - stack_name (e.g. 'behaviour')
+    """
+    assert context.failed is False
+
+    stack_name = get_stack_name()
+    extra_vars = get_stack_extra_vars(
+        stack_name, stack_image_tag=stack_image_tag, step_text=context.text
     )
+    start_stack_creation(stack_name, extra_vars=extra_vars)
 
-    assert DJANGO_SUPERUSER_PASSWORD
-    extra_vars: Dict[str, str] = {
-        "stack_django_superuser_password": DJANGO_SUPERUSER_PASSWORD,
-        "stack_name": stack_name,
-        "stack_image_tag": stack_image_tag,
-        "stack_oidc_rp_client_id": stack_oidc_rp_client_id,
-        "stack_oidc_rp_client_secret": get_stack_client_id_secret(),
-    }
+    context.stack_name = stack_name
 
-    # If the user has passed in extra variables, merge them in.
-    if context.text:
-        print(context.text)
-        step_vars = ast.literal_eval(context.text)
-        extra_vars |= step_vars
-        print(f"Using step text as extra variables: {step_vars}")
 
-    wipe_jt = AWX_STACK_WIPE_JOB_TEMPLATE % {
-        "username": get_stack_username().capitalize()
-    }
-    launch_awx_job_template(wipe_jt, extra_vars=extra_vars)
+@given("the new stack is ready")  # pylint: disable=not-callable
+@then("the new stack is ready")  # pylint: disable=not-callable
+def the_new_stack_is_ready(context) -> None:
+    """Waits for the stack being created by the step
+    'a new stack is being created using the image tag' (in this or an earlier
+    scenario) to be created. Sets the following context members: -
+    - stack_name (e.g. 'behaviour')
+    """
+    assert context.failed is False
 
-    create_jt = AWX_STACK_CREATE_JOB_TEMPLATE % {
-        "username": get_stack_username().capitalize()
-    }
-    launch_awx_job_template(create_jt, extra_vars=extra_vars)
+    stack_name = get_stack_name()
+    wait_for_stack(stack_name)
+
+    # Objects (and their IDs) on any prior stack have gone.
+    forget_object_ids(base_url=get_stack_url(stack_name))
 
     context.stack_name = stack_name
     print(f"Created stack '{stack_name}'")
@@ -190,18 +215,13 @@ def i_can_get_the_x_target_id(context, title) -> None:
     assert hasattr(context, "stack_name")
 
     session_id = context.session_id if hasattr(context, "session_id") else None
-    url_encoded_title = urllib.parse.quote(title)
-    resp = api_get_request(
+    target_id = get_object_id(
         base_url=get_stack_url(context.stack_name),
-        endpoint=f"/api/targets?{url_encoded_title}",
+        endpoint="/api/targets/",
         session_id=session_id,
+        title=title,
     )
-    assert resp.status_code == 200
-
-    assert "application/json" in resp.headers.get("Content-Type", "")
-    assert "results" in resp.json()
-    assert len(resp.json()["results"]) > 0
-    target_id = resp.json()["results"][0]["id"]
+    assert target_id, f"Target '{title}' not found"
     print(f"target_id={target_id}")
     context.target_id = target_id
 
@@ -217,18 +237,15 @@ def i_can_get_the_last_job_file_transfer_id(context) -> None:
     assert hasattr(context, "stack_name")
 
     session_id = context.session_id if hasattr(context, "session_id") else None
-    resp = api_get_request(
+    job_file_transfer = get_last_object(
         base_url=get_stack_url(context.stack_name),
         endpoint="/api/job_file_transfer/",
         session_id=session_id,
     )
-    assert resp.status_code == 200
 
     # We only call this if we expect at least one JobFileTransfer record.
-    assert "application/json" in resp.headers.get("Content-Type", "")
-    assert "count" in resp.json()
-    assert resp.json()["count"] > 0
-    job_file_transfer_id = resp.json()["results"][-1]["id"]
+    assert job_file_transfer, "No JobFileTransfer found"
+    job_file_transfer_id = job_file_transfer["id"]
     print(f"job_file_transfer_id={job_file_transfer_id}")
     context.job_file_transfer_id = job_file_transfer_id
 
@@ -245,18 +262,15 @@ def i_can_get_the_last_job_file_transfer_sub_path(context) -> None:
     assert hasattr(context, "stack_name")
 
     session_id = context.session_id if hasattr(context, "session_id") else None
-    resp = api_get_request(
+    job_file_transfer = get_last_object(
         base_url=get_stack_url(context.stack_name),
         endpoint="/api/job_file_transfer/",
         session_id=session_id,
     )
-    assert resp.status_code == 200
 
     # We only call this if we expect at least one JobFileTransfer record.
-    assert "application/json" in resp.headers.get("Content-Type", "")
-    assert "count" in resp.json()
-    assert resp.json()["count"] > 0
-    sub_path = resp.json()["results"][-1]["sub_path"]
+    assert job_file_transfer, "No JobFileTransfer found"
+    sub_path = job_file_transfer["sub_path"]
     print(f"job_file_transfer_sub_path={sub_path}")
     context.job_file_transfer_sub_path = sub_path
 
@@ -272,18 +286,14 @@ def i_can_get_the_x_project_id(context, title) -> None:
     assert hasattr(context, "stack_name")
 
     session_id = context.session_id if hasattr(context, "session_id") else None
-    url_encoded_title = urllib.parse.quote(title)
-    resp = api_get_request(
+    project_id = get_object_id(
         base_url=get_stack_url(context.stack_name),
-        endpoint=f"/api/projects?{url_encoded_title}",
+        endpoint="/api/projects/",
         session_id=session_id,
+        title=title,
+        match_field="target_access_string",
     )
-    assert resp.status_code == 200
-
-    assert "application/json" in resp.headers.get("Content-Type", "")
-    assert "results" in resp.json()
-    assert len(resp.json()["results"]) > 0
-    project_id = resp.json()["results"][0]["id"]
+    assert project_id, f"Project '{title}' not found"
     print(f"project_id={project_id}")
     context.project_id = project_id
 
@@ -300,18 +310,13 @@ def i_can_get_the_x_session_project_id(context, title) -> None:
 
     print(f"Getting SessionProject ID for '{title}'...")
     session_id = context.session_id if hasattr(context, "session_id") else None
-    url_encoded_title = urllib.parse.quote(title)
-    resp = api_get_request(
+    session_project_id = get_object_id(
         base_url=get_stack_url(context.stack_name),
-        endpoint=f"/api/session-projects?{url_encoded_title}",
+        endpoint="/api/session-projects/",
         session_id=session_id,
+        title=title,
     )
-    assert resp.status_code == 200
-
-    assert "application/json" in resp.headers.get("Content-Type", "")
-    assert "results" in resp.json()
-    assert len(resp.json()["results"]) > 0
-    session_project_id = resp.json()["results"][0]["id"]
+    assert session_project_id, f"SessionProject '{title}' not found"
     print(f"Got session_project_id={session_project_id}")
     context.session_project_id = session_project_id
 
@@ -335,6 +340,9 @@ def i_delete_the_session_project(context) -> None:
         endpoint=f"/api/session-projects/{context.session_project_id}",
         session_id=context.session_id,
     )
+    forget_object_ids(
+        base_url=get_stack_url(context.stack_name), endpoint="/api/session-projects/"
+    )
     context.status_code = resp.status_code
 
 
@@ -350,18 +358,13 @@ def i_can_get_the_x_snapshot_id(context, title) -> None:
 
     print(f"Getting Snapshot ID for '{title}'...")
     session_id = context.session_id if hasattr(context, "session_id") else None
-    url_encoded_title = urllib.parse.quote(title)
-    resp = api_get_request(
+    snapshot_id = get_object_id(
         base_url=get_stack_url(context.stack_name),
-        endpoint=f"/api/snapshots?{url_encoded_title}",
+        endpoint="/api/snapshots/",
         session_id=session_id,
+        title=title,
     )
-    assert resp.status_code == 200, f"Expected 200, was {resp.status_code}"
-
-    assert "application/json" in resp.headers.get("Content-Type", "")
-    assert "results" in resp.json()
-    assert len(resp.json()["results"]) > 0
-    snapshot_id = resp.json()["results"][0]["id"]
+    assert snapshot_id, f"Snapshot '{title}' not found"
     print(f"Got snapshot_id={snapshot_id}")
     context.snapshot_id = snapshot_id
 
@@ -385,6 +388,9 @@ def i_delete_the_snapshot(context) -> None:
         endpoint=f"/api/snapshots/{context.snapshot_id}",
         session_id=context.session_id,
     )
+    forget_object_ids(
+        base_url=get_stack_url(context.stack_name), endpoint="/api/snapshots/"
+    )
     context.status_code = resp.status_code
 
 
@@ -472,10 +478,15 @@ def i_run_x_with_the_following_variables(context, job_name, collection_name) ->
 )
 def the_landing_page_response_should_be_x(context, status_code_name) -> None:
     """Just make sure the stack is up, and relies on context members: -
-    - stack_name"""
+    - stack_name
+    If we expect OK we first wait for the stack to be ready
+    (for up to BEHAVIOUR_STACK_READY_TIMEOUT_S seconds)."""
     assert context.failed is False
     assert hasattr(context, "stack_name")
 
+    if status_code_name == "OK":
+        wait_for_stack_readiness(get_stack_url(context.stack_name))
+
     resp = requests.get(get_stack_url(context.stack_name), timeout=REQUEST_TIMEOUT)
     assert resp
 
@@ -589,23 +600,9 @@ def the_task_should_have_a_value_of_x_within_y_z(
     assert hasattr(context, "session_id")
     assert hasattr(context, "task_status_endpoint")
 
-    assert timeout > 0
-
-    start_time = datetime.now()
-
-    assert timeout_units in ["minute", "minutes", "second", "seconds"]
-    if timeout_units.startswith("minute"):
-        timeout_period = timedelta(minutes=timeout)
-    else:
-        timeout_period = timedelta(seconds=timeout)
-
-    print(f"Waiting for task at {context.task_status_endpoint} [{start_time}]...")
-
-    done: bool = False
-    data: Optional[Dict[str, Any]] = None
-    now: datetime = start_time
-    while not done:
+    timeout_period = get_timeout_period(timeout, timeout_units)
 
+    def _get_task_status() -> Tuple[bool, Dict[str, Any]]:
         # Get the task status.
         # The response normally contains the following properties: -
         # - started (boolean)
@@ -618,18 +615,16 @@ def the_task_should_have_a_value_of_x_within_y_z(
             session_id=context.session_id,
         )
         assert resp.status_code == http.HTTPStatus["OK"].value
+        task_data: Dict[str, Any] = resp.json()
+        return bool(task_data.get("finished")), task_data
 
-        data = resp.json()
-        if "finished" in data and data["finished"]:
-            print("Task upload has finished")
-            done = True
-        else:
-            now = datetime.now()
-            assert now - start_time <= timeout_period
-            time.sleep(REQUEST_POLL_PERIOD_S)
-
-    print(f"Finished waiting [{now}]")
+    print(f"Waiting for task at {context.task_status_endpoint} [{datetime.now()}]...")
+    result = poll(_get_task_status, timeout=timeout_period)
+    print(f"Finished waiting [{datetime.now()}]")
+    assert result.done, f"Timed out waiting for task ({timeout} {timeout_units})"
+    print("Task upload has finished")
 
+    data = result.value
     assert data
     assert "status" in data
     task_status = data["status"]
@@ -637,10 +632,72 @@ def the_task_should_have_a_value_of_x_within_y_z(
     assert task_status == status
 
 
+@then(  # pylint: disable=not-callable
+    "all the task statuses should have a value of {status} within {timeout:d} {timeout_units}"
+)
+def all_the_task_statuses_should_have_a_value_of_x_within_y_z(
+    context, status, timeout, timeout_units
+) -> None:
+    """Waits for the tasks of all the files loaded by the step
+    'I load the following ... encoded files' (polling all of them together),
+    prints the time each target took to upload and to be processed,
+    and checks every task has the given status. Relies on context members: -
+    - batch_uploads
+    - session_id
+    """
+    assert context.failed is False
+    assert hasattr(context, "batch_uploads")
+    assert hasattr(context, "session_id")
+
+    timeout_period = get_timeout_period(timeout, timeout_units)
+    # The final task data of each target file (when its task has finished),
+    # and the (monotonic) time we found the task had finished
+    finished_tasks: Dict[str, Tuple[Dict[str, Any], float]] = {}
+
+    def _get_task_statuses() -> Tuple[bool, Dict[str, Tuple[Dict[str, Any], float]]]:
+        for target_file, upload in context.batch_uploads.items():
+            if target_file in finished_tasks:
+                continue
+            resp = api_get_request(
+                base_url=get_stack_url(context.stack_name),
+                endpoint=upload["task_status_endpoint"],
+                session_id=context.session_id,
+            )
+            assert resp.status_code == http.HTTPStatus["OK"].value
+            task_data: Dict[str, Any] = resp.json()
+            if task_data.get("finished"):
+                finished_tasks[target_file] = (task_data, time.monotonic())
+        return len(finished_tasks) == len(context.batch_uploads), finished_tasks
+
+    print(f"Waiting for {len(context.batch_uploads)} tasks [{datetime.now()}]...")
+    result = poll(_get_task_statuses, timeout=timeout_period)
+    print(f"Finished waiting [{datetime.now()}]")
+
+    print("Target load timing (seconds): -")
+    print(f"{'upload_s':>9} {'process_s':>10}  status   file")
+    for target_file, upload in context.batch_uploads.items():
+        task_data, finished_at = finished_tasks.get(target_file, ({}, None))
+        process_s: str = (
+            f"{finished_at - upload['accepted_at']:>10.1f}"
+            if finished_at
+            else "         -"
+        )
+        print(
+            f"{upload['upload_s']:>9.1f} {process_s}"
+            f"  {task_data.get('status', '-'):<8} {target_file}"
+        )
+
+    assert result.done, f"Timed out waiting for tasks ({timeout} {timeout_units})"
+    for target_file, (task_data, _) in finished_tasks.items():
+        assert task_data.get("status") == status, f"{target_file} was not {status}"
+
+
 @when("I do a {method} request at {endpoint}")  # pylint: disable=not-callable
 def i_do_a_x_request_at_y(context, method, endpoint) -> None:
     """Makes a REST request on an endpoint. Relies on context members: -
     - stack_name
+    And uses any (optional): -
+    - prefetched_responses
     Sets the following context members: -
     - status_code
     - response
@@ -652,12 +709,14 @@ def i_do_a_x_request_at_y(context, method, endpoint) -> None:
     stack_url = get_stack_url(context.stack_name)
     print(f"stack_url={stack_url}")
 
-    # Django POST needs a trailing '/'.
-    # Add one in case the user forgot
-    if method == "POST" and not endpoint.endswith("/"):
-        endpoint += "/"
-
-    resp = requests.request(method, stack_url + endpoint, timeout=REQUEST_TIMEOUT)
+    # Use any response made when preparing a '@concurrent' Scenario Outline
+    # (see environment.py), otherwise make the request now.
+    prefetched_responses = (
+        context.prefetched_responses if hasattr(context, "prefetched_responses") else {}
+    )
+    resp = prefetched_responses.get((method, endpoint))
+    if resp is None:
+        resp = api_request(base_url=stack_url, method=method, endpoint=endpoint)
     context.response = resp
     context.status_code = resp.status_code
     if (
@@ -675,32 +734,36 @@ def i_get_the_x_encoded_file_y_from_the_bucket(context, ext, bucket_object) -> N
     """Download a file (assumes we have a bucket) and relies on context members: -
     - bucket_name
     We append ".{ext}" to the bucket_object and set the following context members: -
+    - target_directory (the S3 cache directory holding the file,
+      None if BEHAVIOUR_S3_STREAM_UPLOADS is set)
     - target_file (i.e. 'file.tgz')"""
     assert context.failed is False
     assert hasattr(context, "bucket_name")
 
     target_file = f"{bucket_object}.{ext.lower()}"
-    target_path = f"{_DOWNLOAD_PATH}/{target_file}"
+    context.target_file = target_file
 
-    # Do nothing if the destination file exists
-    if os.path.exists(target_path) and os.path.isfile(target_path):
-        print(f"Target file {target_file} already exists")
-        context.target_file = target_file
+    if S3_STREAM_UPLOADS:
+        # The file's streamed from the bucket when it's loaded
+        print(f"Not getting object ({bucket_object}) [{ext}], it will be streamed")
+        context.target_directory = None
         return
 
     print(f"Getting object ({bucket_object}) [{ext}]...")
-    get_object(context.bucket_name, target_file, _DOWNLOAD_PATH)
+    target_path: str = get_cached_object(context.bucket_name, target_file)
     print("Got it")
 
-    context.target_file = target_file
+    context.target_directory = os.path.dirname(target_path)
 
 
 @when(  # pylint: disable=not-callable
     'I load the file against target access string "{tas}"'
 )
 def i_load_the_file_against_target_access_string_x(context, tas) -> None:
-    """Loads a previously downloaded file into the stack using the given TAS.
+    """Loads a previously downloaded file into the stack using the given TAS
+    (or streams it from the bucket if there's no target directory).
     Relies on context members: -
+    - target_directory
     - target_file
     - session_id
     We set the following context members: -
@@ -708,24 +771,123 @@ def i_load_the_file_against_target_access_string_x(context, tas) -> None:
     - status_code
     """
     assert context.failed is False
+    assert hasattr(context, "target_directory")
     assert hasattr(context, "target_file")
     assert hasattr(context, "session_id")
 
     stack_url = get_stack_url(context.stack_name)
     print(f"Loading under {tas} at {stack_url}...")
-    resp: requests.Response = upload_target_experiment(
-        base_url=stack_url,
-        session_id=context.session_id,
-        tas=tas,
-        file_directory=_DOWNLOAD_PATH,
-        file_name=context.target_file,
-    )
+    if context.target_directory is None:
+        # Stream the file from the bucket (see BEHAVIOUR_S3_STREAM_UPLOADS)
+        assert hasattr(context, "bucket_name")
+        with closing(
+            open_object_stream(context.bucket_name, context.target_file)
+        ) as file_stream:
+            resp: requests.Response = upload_target_experiment(
+                base_url=stack_url,
+                session_id=context.session_id,
+                tas=tas,
+                file_name=context.target_file,
+                file_stream=file_stream,
+            )
+    else:
+        resp = upload_target_experiment(
+            base_url=stack_url,
+            session_id=context.session_id,
+            tas=tas,
+            file_name=context.target_file,
+            file_directory=context.target_directory,
+        )
 
     print(f"Loaded ({resp.status_code})")
     context.response = resp
     context.status_code = resp.status_code
 
 
+@when(  # pylint: disable=not-callable
+    'I load the following {ext} encoded files against target access string "{tas}"'
+)
+def i_load_the_following_x_encoded_files_against_target_access_string_y(
+    context, ext, tas
+) -> None:
+    """Gets the target files (from the bucket) named in the step's table
+    (the 'file' column, without the ".{ext}") and loads them into the stack using
+    the given TAS, uploading up to BEHAVIOUR_CONCURRENT_UPLOADS at the same time.
+    Every upload is expected to be ACCEPTED and each file may only be listed once.
+    Relies on context members: -
+    - bucket_name
+    - session_id
+    - stack_name
+    We set the following context members: -
+    - batch_uploads (the task status endpoint, upload time and the time
+      each upload was accepted, keyed by target file)
+    """
+    assert context.failed is False
+    assert context.table
+    assert hasattr(context, "bucket_name")
+    assert hasattr(context, "session_id")
+
+    stack_url = get_stack_url(context.stack_name)
+    target_files: List[str] = [
+        f"{row['file']}.{ext.lower()}" for row in context.table.rows
+    ]
+    # Uploads (and their tasks) are recorded by file, so each file is loaded once
+    duplicates: List[str] = sorted(
+        {
+            target_file
+            for target_file in target_files
+            if target_files.count(target_file) > 1
+        }
+    )
+    assert not duplicates, f"Files must only be listed once: {', '.join(duplicates)}"
+
+    def load(target_file: str) -> Tuple[requests.Response, float, float]:
+        # Returns the response, and the (monotonic) time the upload started
+        # and was accepted (the time the response was received).
+        # The file is fetched (or its stream opened) before the upload starts
+        # so the upload time does not include getting the file from S3.
+        with ExitStack() as stack:
+            upload_file: Dict[str, Any]
+            if S3_STREAM_UPLOADS:
+                upload_file = {
+                    "file_stream": stack.enter_context(
+                        closing(open_object_stream(context.bucket_name, target_file))
+                    )
+                }
+            else:
+                target_path: str = get_cached_object(context.bucket_name, target_file)
+                upload_file = {"file_directory": os.path.dirname(target_path)}
+            start: float = time.monotonic()
+            resp = upload_target_experiment(
+                base_url=stack_url,
+                session_id=context.session_id,
+                tas=tas,
+                file_name=target_file,
+                progress_callback=lambda sent, total: None,
+                **upload_file,
+            )
+            accepted_at: float = time.monotonic()
+        return resp, start, accepted_at
+
+    print(f"Loading {len(target_files)} files under {tas} at {stack_url}...")
+    with ThreadPoolExecutor(max_workers=CONCURRENT_UPLOADS) as executor:
+        results = dict(zip(target_files, executor.map(load, target_files)))
+
+    context.batch_uploads = {}
+    for target_file, (resp, start, accepted_at) in results.items():
+        print(
+            f"Loaded {target_file} ({resp.status_code}) in {accepted_at - start:.1f}s"
+        )
+        assert resp.status_code == http.HTTPStatus.ACCEPTED
+        task_status_endpoint: str = resp.json()["task_status_url"]
+        assert task_status_endpoint.startswith("/viewer/task_status/")
+        context.batch_uploads[target_file] = {
+            "task_status_endpoint": task_status_endpoint,
+            "upload_s": accepted_at - start,
+            "accepted_at": accepted_at,
+        }
+
+
 @when(  # pylint: disable=not-callable
     'I create a new SessionProject with the title "{title}"'
 )
@@ -887,25 +1049,9 @@ def the_file_transfer_status_should_have_a_value_of_x_within_y_z(
     assert hasattr(context, "session_id")
     assert hasattr(context, "job_file_transfer_id")
 
-    assert timeout > 0
-
-    start_time = datetime.now()
-
-    assert timeout_units in ["minute", "minutes", "second", "seconds"]
-    if timeout_units.startswith("minute"):
-        timeout_period = timedelta(minutes=timeout)
-    else:
-        timeout_period = timedelta(seconds=timeout)
-
-    print(
-        f"Waiting for job file transfer {context.job_file_transfer_id} [{start_time}]..."
-    )
-
-    done: bool = False
-    data: Optional[Dict[str, Any]] = None
-    now: datetime = start_time
-    while not done:
+    timeout_period = get_timeout_period(timeout, timeout_units)
 
+    def _get_job_file_transfer() -> Tuple[bool, Optional[Dict[str, Any]]]:
         # Get the Job File Transfer status.
         # The response normally contains the following properties: -
         # - transfer_status (i.e. SUCCESS, FAILURE)
@@ -920,17 +1066,21 @@ def the_file_transfer_status_should_have_a_value_of_x_within_y_z(
         if "application/json" in resp.headers.get("Content-Type", "") and isinstance(
             resp.json(), dict
         ):
-            data = resp.json()
-            if "transfer_datetime" in data and data["transfer_datetime"]:
-                print("Job file transfer finished")
-                done = True
-        else:
-            now = datetime.now()
-            assert now - start_time <= timeout_period
-            time.sleep(REQUEST_POLL_PERIOD_S)
+            transfer_data: Dict[str, Any] = resp.json()
+            return bool(transfer_data.get("transfer_datetime")), transfer_data
+        return False, None
 
-    print(f"Finished waiting [{now}]")
+    print(
+        f"Waiting for job file transfer {context.job_file_transfer_id} [{datetime.now()}]..."
+    )
+    result = poll(_get_job_file_transfer, timeout=timeout_period)
+    print(f"Finished waiting [{datetime.now()}]")
+    assert (
+        result.done
+    ), f"Timed out waiting for job file transfer ({timeout} {timeout_units})"
+    print("Job file transfer finished")
 
+    data = result.value
     assert isinstance(data, dict)
     assert "transfer_status" in data
     assert (
@@ -957,60 +1107,62 @@ def the_job_request_should_have_a_x_value_of_y_within_z_m(
     assert hasattr(context, "session_id")
     assert hasattr(context, "job_request_id")
 
-    assert timeout > 0
-
-    start_time = datetime.now()
+    timeout_period = get_timeout_period(timeout, timeout_units)
 
-    assert timeout_units in ["minute", "minutes", "second", "seconds"]
-    if timeout_units.startswith("minute"):
-        timeout_period = timedelta(minutes=timeout)
-    else:
-        timeout_period = timedelta(seconds=timeout)
-
-    print(f"Waiting for job request {context.job_request_id} [{start_time}]...")
-
-    done: bool = False
-    data: Optional[Dict[str, Any]] = None
-    now: datetime = start_time
-    while not done:
-
-        # Get the Job File Transfer status.
-        # The response normally contains the following properties: -
-        # - transfer_status (i.e. SUCCESS, FAILURE)
-        # - transfer_datetime (the time the transfer finished)
-        resp = api_get_request(
-            base_url=get_stack_url(context.stack_name),
-            endpoint="/api/job_request/",
-            session_id=context.session_id,
-        )
-        assert (
-            resp.status_code == http.HTTPStatus["OK"].value
-        ), f"Expected 200, was {resp.status_code}"
-
-        # Find our JobRequest in the response,
-        # and wait until it has the expected status.
-        assert "results" in resp.json()
-        data = next(
-            (
-                jr_response
-                for jr_response in resp.json()["results"]
-                if jr_response["id"] == context.job_request_id
-            ),
-            None,
-        )
-        assert data, f"JobRequest {context.job_request_id} not found"
-        if data[property_name] == property_value:
-            print(f"Job request {property_name} status satisfied")
-            done = True
-        else:
-            now = datetime.now()
-            current_value = data[property_name]
-            assert (
-                now - start_time <= timeout_period
-            ), f"Timed out waiting for {property_name} '{property_value}', currently '{current_value}'"
-            time.sleep(REQUEST_POLL_PERIOD_S)
-
-    print(f"Finished waiting [{now}]")
+    stack_url = get_stack_url(context.stack_name)
+    # Stacks that do not provide the JobRequest (detail) endpoint
+    # are searched for the JobRequest using the (paginated) list instead.
+    use_job_request_list: bool = False
+
+    def _get_job_request() -> Tuple[bool, Dict[str, Any]]:
+        nonlocal use_job_request_list
+
+        job_request_data: Optional[Dict[str, Any]] = None
+        if not use_job_request_list:
+            resp = api_get_request(
+                base_url=stack_url,
+                endpoint=f"/api/job_request/{context.job_request_id}/",
+                session_id=context.session_id,
+            )
+            if resp.status_code in (
+                http.HTTPStatus["NOT_FOUND"].value,
+                http.HTTPStatus["METHOD_NOT_ALLOWED"].value,
+            ):
+                print("No JobRequest endpoint, using the JobRequest list...")
+                use_job_request_list = True
+            else:
+                assert (
+                    resp.status_code == http.HTTPStatus["OK"].value
+                ), f"Expected 200, was {resp.status_code}"
+                job_request_data = resp.json()
+
+        if use_job_request_list:
+            # Find our JobRequest in the list (stopping at the page it's on)
+            job_request_data = next(
+                (
+                    jr_response
+                    for jr_response in api_get_paginated_results(
+                        base_url=stack_url,
+                        endpoint="/api/job_request/",
+                        session_id=context.session_id,
+                    )
+                    if jr_response["id"] == context.job_request_id
+                ),
+                None,
+            )
+
+        # Wait until our JobRequest has the expected status.
+        assert job_request_data, f"JobRequest {context.job_request_id} not found"
+        return job_request_data[property_name] == property_value, job_request_data
+
+    print(f"Waiting for job request {context.job_request_id} [{datetime.now()}]...")
+    result = poll(_get_job_request, timeout=timeout_period)
+    print(f"Finished waiting [{datetime.now()}]")
+    current_value = result.value[property_name]
+    assert (
+        result.done
+    ), f"Timed out waiting for {property_name} '{property_value}', currently '{current_value}'"
+    print(f"Job request {property_name} status satisfied")
 
 
 @when(  # pylint: disable=not-callable
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+"""Puts the stack under load by replaying API operations (using the same API
+utilities as the behaviour steps) with a number of virtual users.
+
+Each virtual user (a thread) repeatedly picks an operation from a weighted mix
+and runs it, until the duration (seconds) has passed or it has run the given
+number of iterations. The operations are: -
+
+-   'list'            an anonymous GET of one of the public list endpoints
+-   'session-project' creates (as the logged-in user) a SessionProject and
+                      Snapshot for a Target, and then deletes them
+
+When the virtual users have finished we print the throughput, latency
+percentiles and error rate of each operation, followed by the latency of
+each endpoint.
+
+Run from the behaviour directory (with the usual BEHAVIOUR_ environment
+variables), i.e.: -
+
+    ./run_load.py --users 10 --duration 60 --mix list=8,session-project=2
+"""
+
+import argparse
+import contextlib
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+_BEHAVIOUR_DIR: str = os.path.dirname(os.path.abspath(__file__))
+
+# The API utilities are in the features' steps directory
+sys.path.insert(0, os.path.join(_BEHAVIOUR_DIR, "features", "steps"))
+
+# pylint: disable=wrong-import-position
+from api_utils import (
+    api_delete_request,
+    api_request,
+    close_api_clients,
+    close_request_log,
+    create_session_project,
+    create_snapshot,
+    get_object_id,
+    percentile,
+    print_latency_report,
+    set_request_labels,
+)
+from browser_utils import close_browser, login
+from config import get_stack_name, get_stack_url
+
+# The public list endpoints used by the 'list' operation
+_LIST_ENDPOINTS: List[str] = [
+    "/api/compound-sets/",
+    "/api/projects/",
+    "/api/session-projects/",
+    "/api/site_observations/",
+    "/api/snapshots/",
+    "/api/tag_category/",
+    "/api/targets/",
+]
+
+
+class _LoadContext:  # pylint: disable=too-few-public-methods
+    """What the operations need to know about the stack, and the results
+    (latencies and errors) of the operations, which are recorded by all the
+    virtual users."""
+
+    def __init__(
+        self, stack_url: str, *, session_id: Optional[str], target_id: Optional[int]
+    ) -> None:
+        self.stack_url: str = stack_url
+        self.session_id: Optional[str] = session_id
+        self.target_id: Optional[int] = target_id
+        # The latency (seconds) of each operation, keyed by operation
+        self.latencies: Dict[str, List[float]] = {}
+        # The number of operations that failed, keyed by operation
+        self.errors: Dict[str, int] = {}
+        # The first error (exception) of each operation, keyed by operation
+        self.first_errors: Dict[str, str] = {}
+        self.lock: threading.Lock = threading.Lock()
+
+    def record(
+        self, operation: str, latency_s: float, *, error: Optional[Exception]
+    ) -> None:
+        """Records the result of an operation (and its error, if it failed)."""
+        with self.lock:
+            self.latencies.setdefault(operation, []).append(latency_s)
+            if error is not None:
+                self.errors[operation] = self.errors.get(operation, 0) + 1
+                self.first_errors.setdefault(operation, repr(error))
+
+
+def _list(context: _LoadContext) -> None:
+    """GETs (anonymously) a randomly chosen list endpoint."""
+    api_request(
+        base_url=context.stack_url,
+        method="GET",
+        endpoint=random.choice(_LIST_ENDPOINTS),
+    ).raise_for_status()
+
+
+def _session_project(context: _LoadContext) -> None:
+    """Creates a SessionProject and Snapshot (for the Target), then deletes them."""
+    assert context.session_id
+    assert context.target_id
+    title: str = f"Load {threading.get_ident()} {time.monotonic_ns()}"
+    resp = create_session_project(
+        base_url=context.stack_url,
+        session_id=context.session_id,
+        target_id=context.target_id,
+        title=title,
+    )
+    resp.raise_for_status()
+    session_project_id: int = resp.json()["id"]
+
+    try:
+        resp = create_snapshot(
+            base_url=context.stack_url,
+            session_id=context.session_id,
+            session_project_id=session_project_id,
+            title=title,
+        )
+        resp.raise_for_status()
+        api_delete_request(
+            base_url=context.stack_url,
+            endpoint=f"/api/snapshots/{resp.json()['id']}/",
+            session_id=context.session_id,
+        ).raise_for_status()
+    finally:
+        # Always remove the SessionProject (any earlier error is raised first)
+        resp = api_delete_request(
+            base_url=context.stack_url,
+            endpoint=f"/api/session-projects/{session_project_id}/",
+            session_id=context.session_id,
+        )
+    resp.raise_for_status()
+
+
+# The operations, keyed by name
+# Each raises an exception if it fails (i.e. requests' HTTPError)
+_OPERATIONS: Dict[str, Callable[[_LoadContext], None]] = {
+    "list": _list,
+    "session-project": _session_project,
+}
+
+
+def _get_mix(mix: str) -> Dict[str, int]:
+    """Returns the weight of each operation in the mix
+    (i.e. 'list=8,session-project=2')."""
+    weights: Dict[str, int] = {}
+    for item in mix.split(","):
+        operation, _, weight = item.partition("=")
+        assert operation in _OPERATIONS, f"Unknown operation '{operation}'"
+        weights[operation] = int(weight or "1")
+        assert weights[operation] > 0, f"The weight of '{operation}' must be above 0"
+    return weights
+
+
+def _run_virtual_user(
+    context: _LoadContext,
+    weights: Dict[str, int],
+    *,
+    deadline: float,
+    iterations: Optional[int],
+) -> None:
+    """Runs operations (chosen by weight) until the deadline (or iterations)."""
+    operations: List[str] = list(weights)
+    operation_weights: List[int] = list(weights.values())
+    iteration: int = 0
+    while time.monotonic() < deadline and (
+        iterations is None or iteration < iterations
+    ):
+        operation: str = random.choices(operations, weights=operation_weights)[0]
+        start: float = time.monotonic()
+        error: Optional[Exception] = None
+        try:
+            _OPERATIONS[operation](context)
+        except Exception as ex:  # pylint: disable=broad-exception-caught
+            error = ex
+        context.record(operation, time.monotonic() - start, error=error)
+        iteration += 1
+
+
+def _print_report(context: _LoadContext, elapsed_s: float) -> None:
+    """Prints the throughput, latency, errors (and error rate) of each operation,
+    followed by the first error of each operation that failed."""
+    print(f"Operations ({elapsed_s:.1f}s): -")
+    print(
+        f"{'count':>7} {'per_s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'errors':>7}"
+        f" {'error_%':>8}  operation"
+    )
+    for operation, latencies in sorted(context.latencies.items()):
+        ordered: List[float] = sorted(latencies)
+        p50, p95, p99 = (percentile(ordered, percent) for percent in (50, 95, 99))
+        errors: int = context.errors.get(operation, 0)
+        print(
+            f"{len(ordered):>7} {len(ordered) / elapsed_s:>8.2f}"
+            f" {p50:>8.3f} {p95:>8.3f} {p99:>8.3f} {errors:>7}"
+            f" {errors / len(ordered):>8.1%}  {operation}"
+        )
+
+    if not context.first_errors:
+        return
+
+    print("First error of each operation: -")
+    for operation, error in sorted(context.first_errors.items()):
+        print(f"{operation}: {error}")
+
+
+def main() -> int:
+    """Runs the virtual users, returning 1 if any operation failed."""
+    parser = argparse.ArgumentParser(
+        description="Put the stack under load with a mix of API operations"
+    )
+    parser.add_argument("--users", type=int, default=4, help="Virtual users")
+    parser.add_argument(
+        "--duration", type=int, default=60, help="How long to run (seconds)"
+    )
+    parser.add_argument(
+        "--iterations", type=int, help="Operations run by each user (at most)"
+    )
+    parser.add_argument(
+        "--mix",
+        default="list",
+        help="Operation weights (i.e. 'list=8,session-project=2')",
+    )
+    parser.add_argument(
+        "--target", default="A71EV2A", help="The Target used for SessionProjects"
+    )
+    parser.add_argument(
+        "--login-type", default="cas", help="How the user logs in (i.e. 'superuser')"
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Show the output of the operations (hidden by default)",
+    )
+    args = parser.parse_args()
+    assert args.users > 0
+
+    # Files (i.e. the request log and login cache) are relative to this directory
+    os.chdir(_BEHAVIOUR_DIR)
+    weights: Dict[str, int] = _get_mix(args.mix)
+    stack_url: str = get_stack_url(get_stack_name())
+    session_id: Optional[str] = None
+    target_id: Optional[int] = None
+    if "session-project" in weights:
+        # Logins (that may use a browser) must be made from this thread
+        session_id = login(stack_url, login_type=args.login_type)
+        target_id = get_object_id(
+            base_url=stack_url,
+            endpoint="/api/targets/",
+            session_id=session_id,
+            title=args.target,
+        )
+        assert target_id, f"Target '{args.target}' not found"
+    context = _LoadContext(stack_url, session_id=session_id, target_id=target_id)
+
+    set_request_labels(scenario="load")
+    print(f"Running {args.users} virtual users against {stack_url} ({weights})...")
+    start: float = time.monotonic()
+    with (
+        open(os.devnull, "w", encoding="utf-8") as devnull,
+        contextlib.redirect_stdout(sys.stdout if args.verbose else devnull),
+        ThreadPoolExecutor(max_workers=args.users) as executor,
+    ):
+        users: List[Future] = [
+            executor.submit(
+                _run_virtual_user,
+                context,
+                weights,
+                deadline=start + args.duration,
+                iterations=args.iterations,
+            )
+            for _ in range(args.users)
+        ]
+    elapsed_s: float = time.monotonic() - start
+
+    close_browser()
+    close_api_clients()
+    close_request_log()
+    _print_report(context, elapsed_s)
+    print_latency_report()
+    # Raises the error of any virtual user that failed (rather than an operation)
+    for user in users:
+        user.result()
+    return 1 if context.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""Runs a scenario of a 'sequential' feature along with only the earlier
+scenarios it depends on, rather than every scenario that precedes it.
+
+Scenarios in sequential features (i.e. the Squonk Job execution feature)
+declare the stack state they rely on and create using tags, i.e.: -
+
+    @consumes.target @produces.snapshot
+    Scenario: Create a SessionProject and Snapshot for A71EV2A
+
+A scenario depends on the nearest earlier scenario that produces each state
+it consumes (and, in turn, on the scenarios they depend on). Scenarios that
+declare nothing depend on every earlier scenario.
+
+Run from the behaviour directory, with the scenario's location
+(feature file and line), i.e.: -
+
+    ./run_scenario.py features/squonk-basic-job-execution.feature:116
+
+Any further arguments are passed to behave.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from typing import List, Optional, Set
+
+from behave.model import Scenario
+from behave.parser import parse_file
+
+# The directory holding this file (and the features)
+_BEHAVIOUR_DIR: str = os.path.dirname(os.path.abspath(__file__))
+
+# Prefixes of the tags used to declare the state scenarios create and rely on
+_PRODUCES_TAG_PREFIX: str = "produces."
+_CONSUMES_TAG_PREFIX: str = "consumes."
+
+
+def _get_states(scenario: Scenario, tag_prefix: str) -> Set[str]:
+    """Returns the states named by the scenario's tags with the given prefix."""
+    return {
+        tag[len(tag_prefix) :] for tag in scenario.tags if tag.startswith(tag_prefix)
+    }
+
+
+def _get_required_scenarios(scenarios: List[Scenario], index: int) -> List[int]:
+    """Returns the indices (in order) of the scenarios that must run
+    for the scenario at the given index to run, including the scenario."""
+    required: Set[int] = {index}
+    pending: List[int] = [index]
+    while pending:
+        scenario_index: int = pending.pop()
+        scenario: Scenario = scenarios[scenario_index]
+        consumes: Set[str] = _get_states(scenario, _CONSUMES_TAG_PREFIX)
+        if not consumes and not _get_states(scenario, _PRODUCES_TAG_PREFIX):
+            # Undeclared, so it may depend on any earlier scenario
+            dependencies: Set[int] = set(range(scenario_index))
+        else:
+            dependencies = set()
+            for state in consumes:
+                producer: Optional[int] = next(
+                    (
+                        producer_index
+                        for producer_index in range(scenario_index - 1, -1, -1)
+                        if state
+                        in _get_states(scenarios[producer_index], _PRODUCES_TAG_PREFIX)
+                    ),
+                    None,
+                )
+                if producer is None:
+                    print(f"Nothing produces '{state}' for '{scenario.name}'")
+                    sys.exit(1)
+                dependencies.add(producer)
+        pending.extend(dependencies - required)
+        required |= dependencies
+    return sorted(required)
+
+
+def main() -> int:
+    """Runs the scenario (and the scenarios it depends on),
+    returning behave's exit code."""
+    parser = argparse.ArgumentParser(
+        description="Run a scenario and only the earlier scenarios it depends on"
+    )
+    parser.add_argument(
+        "location", help="The scenario's feature file and line (i.e. x.feature:20)"
+    )
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="Print the scenarios that would be run (without running them)",
+    )
+    args, behave_args = parser.parse_known_args()
+
+    os.chdir(_BEHAVIOUR_DIR)
+    filename, _, line = args.location.rpartition(":")
+    assert filename and line.isdigit(), "The location must be <feature file>:<line>"
+    scenarios: List[Scenario] = parse_file(filename).scenarios
+    # The scenario is the last one that starts at (or before) the line
+    index: Optional[int] = next(
+        (
+            scenario_index
+            for scenario_index in range(len(scenarios) - 1, -1, -1)
+            if scenarios[scenario_index].line <= int(line)
+        ),
+        None,
+    )
+    assert index is not None, f"There's no scenario at {args.location}"
+
+    locations: List[str] = []
+    for scenario_index in _get_required_scenarios(scenarios, index):
+        scenario: Scenario = scenarios[scenario_index]
+        print(f"{filename}:{scenario.line} {scenario.name}")
+        locations.append(f"{filename}:{scenario.line}")
+    if args.plan:
+        return 0
+
+    return subprocess.run(
+        [sys.executable, "-m", "behave"] + behave_args + locations, check=False
+    ).returncode
+
+
+if __name__ == "__main__":
+    sys.exit(main())
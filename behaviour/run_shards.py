@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+"""Runs the behaviour features in parallel, sharded across several stacks.
+
+The feature files are assigned (in turn) to a number of shards, each shard
+using its own stack (named after BEHAVIOUR_STACK_NAME, i.e. 'behaviour-1',
+'behaviour-2' etc.). Each shard runs its features with behave in a separate
+(worker) process, which creates its stack (as the features normally do).
+The output of each worker is written to a log file in the report directory,
+along with the JUnit reports of every feature, and a summary of all the
+shards' results is printed when they've all finished.
+
+Run from the behaviour directory, i.e.: -
+
+    ./run_shards.py --shards 2
+"""
+
+import argparse
+import glob
+import os
+import subprocess
+import sys
+import xml.etree.ElementTree as ET
+from typing import Dict, List, Tuple
+
+# The directory holding this file (and the features)
+_BEHAVIOUR_DIR: str = os.path.dirname(os.path.abspath(__file__))
+
+
+def _get_shards(features: List[str], num_shards: int) -> List[List[str]]:
+    """Assigns the features (in turn) to the shards,
+    returning only the shards that have features."""
+    shards: List[List[str]] = [[] for _ in range(num_shards)]
+    for index, feature in enumerate(features):
+        shards[index % num_shards].append(feature)
+    return [shard for shard in shards if shard]
+
+
+def _get_shard_env(stack_name: str) -> Dict[str, str]:
+    """Returns the environment of a shard's worker, i.e. its stack name.
+    Files that workers would otherwise share (and write to) are named
+    after the stack."""
+    env: Dict[str, str] = os.environ.copy()
+    env["BEHAVIOUR_STACK_NAME"] = stack_name
+    env["BEHAVIOUR_REQUEST_LOG_FILE"] = f"request-{stack_name}.log"
+    env["BEHAVIOUR_STACK_FINGERPRINT_FILE"] = f".stack-fingerprints-{stack_name}.json"
+    env["BEHAVIOUR_STACK_DATA_SNAPSHOT_FILE"] = (
+        f".stack-data-snapshots-{stack_name}.json"
+    )
+    # The S3 cache is only safe to share between threads (not processes)
+    s3_cache_dir: str = env.get("BEHAVIOUR_S3_CACHE_DIR") or ".s3-cache"
+    env["BEHAVIOUR_S3_CACHE_DIR"] = f"{s3_cache_dir}-{stack_name}"
+    if login_cache_file := env.get("BEHAVIOUR_LOGIN_CACHE_FILE"):
+        env["BEHAVIOUR_LOGIN_CACHE_FILE"] = f"{login_cache_file}.{stack_name}"
+    return env
+
+
+def _start_workers(
+    shards: List[List[str]], *, stack_name_prefix: str, report_dir: str
+) -> Dict[str, Tuple[subprocess.Popen, List[str]]]:
+    """Starts a worker (behave) process for each shard, returning the workers
+    (and their features) keyed by the name of the shard's stack."""
+    workers: Dict[str, Tuple[subprocess.Popen, List[str]]] = {}
+    for number, shard in enumerate(shards, start=1):
+        stack_name: str = f"{stack_name_prefix}-{number}"
+        print(f"Shard {number} (stack '{stack_name}'): {', '.join(shard)}")
+        with open(
+            os.path.join(report_dir, f"{stack_name}.log"), "w", encoding="utf-8"
+        ) as log:
+            # pylint: disable=consider-using-with
+            workers[stack_name] = (
+                subprocess.Popen(
+                    [sys.executable, "-m", "behave", "--junit"]
+                    + ["--junit-directory", report_dir]
+                    + shard,
+                    stdout=log,
+                    stderr=subprocess.STDOUT,
+                    env=_get_shard_env(stack_name),
+                ),
+                shard,
+            )
+    return workers
+
+
+def _remove_junit_reports(report_dir: str) -> None:
+    """Removes the JUnit reports of an earlier run (from the report directory),
+    so they're not counted in this run's totals."""
+    for report in glob.glob(os.path.join(report_dir, "TESTS-*.xml")):
+        os.remove(report)
+
+
+def _get_junit_totals(report_dir: str) -> Tuple[int, int, int, int]:
+    """Returns the number of tests (scenarios), failures, errors
+    and skipped tests in the JUnit reports written by the workers."""
+    totals: List[int] = [0, 0, 0, 0]
+    for report in glob.glob(os.path.join(report_dir, "TESTS-*.xml")):
+        root = ET.parse(report).getroot()
+        for suite in root.iter("testsuite"):
+            for index, name in enumerate(["tests", "failures", "errors", "skipped"]):
+                totals[index] += int(suite.get(name, "0"))
+    return totals[0], totals[1], totals[2], totals[3]
+
+
+def main() -> int:
+    """Runs the shards, returning 0 if they all pass."""
+    parser = argparse.ArgumentParser(
+        description="Run the behaviour features in parallel on several stacks"
+    )
+    parser.add_argument(
+        "--shards", type=int, default=2, help="The number of shards (stacks) to use"
+    )
+    parser.add_argument(
+        "--report-dir",
+        default="shard-reports",
+        help="The directory for the worker logs and JUnit reports",
+    )
+    parser.add_argument(
+        "features",
+        nargs="*",
+        help="The feature files to run (all of them if not provided)",
+    )
+    args = parser.parse_args()
+    assert args.shards > 0
+
+    os.chdir(_BEHAVIOUR_DIR)
+    features: List[str] = args.features or sorted(glob.glob("features/*.feature"))
+    stack_name_prefix: str = os.environ.get("BEHAVIOUR_STACK_NAME", "behaviour")
+    os.makedirs(args.report_dir, exist_ok=True)
+    _remove_junit_reports(args.report_dir)
+
+    workers = _start_workers(
+        _get_shards(features, args.shards),
+        stack_name_prefix=stack_name_prefix,
+        report_dir=args.report_dir,
+    )
+
+    failed: bool = False
+    for stack_name, (worker, shard) in workers.items():
+        returncode: int = worker.wait()
+        result: str = "passed" if returncode == 0 else f"FAILED ({returncode})"
+        print(f"Stack '{stack_name}' {result}: {', '.join(shard)}")
+        failed = failed or returncode != 0
+
+    tests, failures, errors, skipped = _get_junit_totals(args.report_dir)
+    print(
+        f"{tests} scenarios, {failures} failed, {errors} errors, {skipped} skipped"
+        f" (see {args.report_dir})"
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())